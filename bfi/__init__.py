@@ -8,6 +8,8 @@ __email__ = "eknyquist@gmail.com"
 import os
 import sys
 import time
+import mmap
+import collections
 
 OPCODE_MOVE   = 0
 OPCODE_LEFT   = 1
@@ -49,6 +51,13 @@ class BrainfuckSyntaxError(Exception):
     """
     pass
 
+class BrainfuckLimitError(Exception):
+    """
+    Raised when a Brainfuck program exceeds the step limit or time limit
+    passed to :func:`execute`
+    """
+    pass
+
 class Opcode(object):
     """
     Brainfuck intermediate representation opcode
@@ -80,6 +89,127 @@ class Opcode(object):
 
         return ret
 
+class Tape(object):
+    """
+    Brainfuck tape, and cell pointer. Pass one of these to :func:`execute` to
+    start execution from an existing tape state, or to inspect the tape after
+    execution has finished.
+
+    :param int size: number of cells on the tape
+    """
+
+    def __init__(self, size=30000):
+        self.cells = bytearray(size)
+        self.pointer = 0
+
+    def __len__(self):
+        return len(self.cells)
+
+# Values for the 'access' argument of MappedTape
+_MMAP_ACCESS = {
+    "write": mmap.ACCESS_WRITE,
+    "copy": mmap.ACCESS_COPY,
+    "read": mmap.ACCESS_READ,
+}
+
+class MappedTape(Tape):
+    """
+    Brainfuck tape whose cells are memory-mapped, either from a file or from
+    anonymous memory. Can be passed to :func:`execute` in the same way as a
+    :class:`Tape`.
+
+    Pages are only allocated when they are first written, so the tape can be
+    much larger than the amount of memory actually used. With a file, a
+    program can start from an existing tape image, and its final tape is left
+    in the file without any copying. Anonymous tapes are shared with child
+    processes created by ``os.fork()`` (e.g. by ``multiprocessing`` on Linux).
+
+    Use as a context manager, or call :meth:`close` when finished with the tape.
+
+    :param int size: number of cells on the tape. If None, the size of the \
+        file at 'path' is used, and the file must exist and not be empty.
+    :param str path: file to map the tape onto, or None to use anonymous memory. \
+        With 'write' access, the file is created if it doesn't exist, and \
+        extended with zeros if it is smaller than 'size'.
+    :param str access: 'write' to write changes to the file, 'copy' to keep \
+        changes private to this tape (the file is not modified, and unmodified \
+        pages are shared with other processes mapping the same file), or 'read' \
+        for a read-only tape, which raises TypeError if the program writes to \
+        it. Must be 'write' if 'path' is None.
+    """
+
+    def __init__(self, size=None, path=None, access="write"):
+        if access not in _MMAP_ACCESS:
+            raise ValueError("invalid access mode '%s'" % access)
+
+        if (size is not None) and (size < 1):
+            raise ValueError("tape size must be at least 1")
+
+        if path is None:
+            if access != "write":
+                raise ValueError("anonymous tapes must use 'write' access")
+
+            if size is None:
+                raise ValueError("size is required for anonymous tapes")
+
+            self.cells = mmap.mmap(-1, size)
+        else:
+            # mmap can't map an empty file, so check the size before the file
+            # is opened (and possibly created)
+            if size is None:
+                if not os.path.exists(path):
+                    raise ValueError("size is required when %s doesn't exist"
+                                     % path)
+
+                if os.path.getsize(path) == 0:
+                    raise ValueError("size is required when %s is empty" % path)
+
+            mode = "rb"
+            if access == "write":
+                mode = "r+b" if os.path.exists(path) else "w+b"
+
+            with open(path, mode) as fh:
+                filesize = os.fstat(fh.fileno()).st_size
+                if size is None:
+                    size = filesize
+                elif size > filesize:
+                    if access != "write":
+                        raise ValueError("file %s is smaller than tape size %d"
+                                         % (path, size))
+
+                    fh.truncate(size)
+
+                # The mapping stays valid after the file is closed
+                self.cells = mmap.mmap(fh.fileno(), size,
+                                       access=_MMAP_ACCESS[access])
+
+        self.path = path
+        self.pointer = 0
+
+    def flush(self):
+        """
+        Write any changes to the tape back to the file. Does nothing for
+        anonymous tapes, or tapes with 'copy' or 'read' access.
+        """
+
+        if (self.path is not None) and (not self.cells.closed):
+            self.cells.flush()
+
+    def close(self):
+        """
+        Flush and unmap the tape. The tape can't be used after this.
+        """
+
+        if not self.cells.closed:
+            self.flush()
+            self.cells.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
 def _raise_unmatched(brace):
     raise BrainfuckSyntaxError("Error: unmatched '" + brace + "' symbol")
 
@@ -136,7 +266,7 @@ def _is_copyloop(program, size, index, ii):
         i += 1
 
     # If no cell or pointer increments by now, this isn't a copy/multiply loop
-    if (len(mults) == 0) or (depth == 0) or (i == (size - 1)):
+    if (len(mults) == 0) or (depth == 0) or (i >= size):
         return [], 0
 
     ret = [Opcode(OPCODE_COPY, ii, mults)]
@@ -151,7 +281,9 @@ def _is_copyloop(program, size, index, ii):
         depth -= 1
         i += 1
 
-    if (depth != 0) or (i == (size - 1)):
+    # No closing "]" means the loop is unterminated; leave it for parse() to
+    # report as a syntax error
+    if (depth != 0) or (i >= size):
         return [], 0
 
     return ret, (i - index) + 1
@@ -161,7 +293,7 @@ def _is_scanloop(program, size, index, ii):
     Detects a scan loop and returns equivalent opcodes
     """
 
-    if index < (size - 3):
+    if index <= (size - 3):
         clr = program[index : index + 3]
 
         if clr == "[>]":
@@ -177,7 +309,7 @@ def _is_clearloop(program, size, index, ii):
     Detects a clear loop and returns equivalent opcodes
     """
 
-    if index < (size - 3):
+    if index <= (size - 3):
         clr = program[index : index + 3]
         if clr == "[+]" or clr == "[-]":
             return [Opcode(OPCODE_CLEAR, ii)], 3
@@ -201,7 +333,7 @@ def _run_optimizers(program, size, index, ii):
 
     return [], 0
 
-def parse(program):
+def parse(program, opt_level=2, positions=None):
     """
     Convert brainfuck source into some intermediate opcodes that take advantage of
     common brainfuck paradigms to execute more efficiently.
@@ -214,43 +346,77 @@ def parse(program):
         * Collapse sequences of repeated "+", "-", ">" and "<" characters into
           a single opcode
 
+    The amount of optimization can be reduced with 'opt_level', which is
+    mostly useful for debugging the optimizer itself:
+
+        * 0: one opcode per brainfuck instruction, no optimizations
+        * 1: collapse repeated instructions and fold pointer movements into
+          the following opcode
+        * 2: all of the above, and replace common loop constructs (default)
+
     :param str program: Brainfuck source code
+    :param int opt_level: optimization level, 0-2
+    :param list positions: if not None, the source code span of each opcode \
+        will be appended to this list, as a tuple of (start, end) character \
+        offsets into 'program'
     :return: list of intermediate opcodes
     :rtype: [bfi.Opcode]
     """
 
+    if opt_level not in (0, 1, 2):
+        raise ValueError("invalid optimization level %s, expecting 0, 1 or 2"
+            % opt_level)
+
     left_positions = []
     opcodes = []
 
+    source = program
     program = ''.join(program.split())
     size = len(program)
 
     pi = 0
     ii = 0
 
+    # Index of the first character that contributes to the next opcode, only
+    # used when recording source positions
+    span = None
+
     while pi < size:
         if program[pi] not in opcode_map:
             pi += 1
             continue
 
+        if (positions is not None) and (span is None):
+            span = pi
+
         opcode = opcode_map[program[pi]]
 
         if opcode == OPCODE_OPEN:
             # Optimize common loop constructs
-            codes, chars = _run_optimizers(program, size, pi, ii)
-            if chars > 0:
-                opcodes.extend(codes)
-                pi += chars
-                ii = 0
-                continue
+            if opt_level > 1:
+                codes, chars = _run_optimizers(program, size, pi, ii)
+                if chars > 0:
+                    opcodes.extend(codes)
+                    if positions is not None:
+                        positions.append((span, pi + chars))
+                    span = None
+                    pi += chars
+                    ii = 0
+                    continue
 
             if ii != 0:
                 opcodes.append(Opcode(OPCODE_MOVE, 0, ii))
+                if positions is not None:
+                    positions.append((span, pi))
+                span = pi
                 ii = 0
 
             # No optimization possible, treat as normal BF loop
             left_positions.append(len(opcodes))
             opcodes.append(Opcode(OPCODE_OPEN))
+            if positions is not None:
+                positions.append((span, pi + 1))
+            span = None
 
         elif opcode == OPCODE_CLOSE:
             if len(left_positions) == 0:
@@ -260,19 +426,35 @@ def parse(program):
             right = len(opcodes)
             opcodes[left].value = right
             opcodes.append(Opcode(OPCODE_CLOSE, ii, left))
+            if positions is not None:
+                positions.append((span, pi + 1))
+            span = None
             ii = 0
 
         elif opcode in [OPCODE_INPUT, OPCODE_OUTPUT]:
             opcodes.append(Opcode(opcode_map[program[pi]], ii))
+            if positions is not None:
+                positions.append((span, pi + 1))
+            span = None
             ii = 0
         else:
-            num = _count_dupes_ahead(program, pi)
+            num = _count_dupes_ahead(program, pi) if opt_level > 0 else 0
             if opcode == OPCODE_LEFT:
                 ii -= (num + 1)
             elif opcode == OPCODE_RIGHT:
                 ii += (num + 1)
             else:
                 opcodes.append(Opcode(opcode_map[program[pi]], ii, num + 1))
+                if positions is not None:
+                    positions.append((span, pi + num + 1))
+                span = None
+                ii = 0
+
+            if (opt_level == 0) and (ii != 0):
+                opcodes.append(Opcode(OPCODE_MOVE, 0, ii))
+                if positions is not None:
+                    positions.append((span, pi + 1))
+                span = None
                 ii = 0
 
             pi += num
@@ -282,16 +464,836 @@ def parse(program):
     if len(left_positions) != 0:
         _raise_unmatched('[')
 
+    # Keep any trailing pointer movement, so the final cell pointer is correct
+    if ii != 0:
+        opcodes.append(Opcode(OPCODE_MOVE, 0, ii))
+        if positions is not None:
+            positions.append((span, size))
+
+    if positions is not None:
+        # Convert offsets in the whitespace-stripped program back into
+        # offsets in the original source
+        offsets = [i for i, c in enumerate(source) if not c.isspace()]
+        positions[:] = [(offsets[start], offsets[end - 1] + 1)
+                        for start, end in positions]
+
     return opcodes
 
+def _raise_scan_error():
+    raise IndexError("scan loop moved cell pointer outside of tape")
+
+# Number of opcodes executed between checks of the time limit, when one is set
+_TIME_CHECK_INTERVAL = 4096
+
+def _run(opcodes, state, do_read, do_write):
+    """
+    Main interpreter loop. Executes 'opcodes' on the cells of Tape 'state',
+    starting with the cell pointer at 'state.pointer'. The cell pointer is
+    stored back in 'state.pointer' when execution stops, even if it stops
+    because of an exception, so the tape's cells and pointer always agree.
+
+    The opcode dispatch in this loop is repeated in _run_counted, _run_tiered,
+    _run_memo, _run_hooked and _run_iter (each kept separate so that normal
+    runs don't pay for the extra work), and the same semantics are generated
+    as python code by bfi.compiler. Any change to how an opcode is executed
+    must be made in all of them together; bfi.fuzz compares every execution
+    mode against a reference interpreter to catch any that disagree.
+    """
+
+    tape = state.cells
+    pi = state.pointer
+    size = len(opcodes)
+    ii = 0
+
+    try:
+        while ii < size:
+            op = opcodes[ii]
+
+            if op.code == OPCODE_MOVE:
+                pi += op.value
+
+            elif op.code == OPCODE_ADD:
+                pi += op.move
+                tape[pi] = (tape[pi] + op.value) % 256
+
+            elif op.code == OPCODE_SUB:
+                pi += op.move
+                tape[pi] = (tape[pi] - op.value) % 256
+
+            elif op.code == OPCODE_OPEN:
+                pi += op.move
+                if tape[pi] == 0:
+                   ii = op.value
+
+            elif op.code == OPCODE_CLOSE:
+                pi += op.move
+                if tape[pi] != 0:
+                    ii = op.value - 1
+
+            elif op.code == OPCODE_INPUT:
+                pi += op.move
+                ch = do_read()
+                if (ch is not None) and (ch > 0):
+                    tape[pi] = ch
+
+            elif op.code == OPCODE_OUTPUT:
+                pi += op.move
+                do_write(tape[pi])
+
+            elif op.code == OPCODE_CLEAR:
+                pi += op.move
+                tape[pi] = 0
+
+            elif op.code == OPCODE_COPY:
+                pi += op.move
+                if tape[pi] > 0:
+                    for off in op.value:
+                        index = pi + off
+                        tape[index] = (tape[index]
+                            + (tape[pi] * op.value[off])) % 256
+
+                    tape[pi] = 0
+
+            elif op.code == OPCODE_SCANL:
+                pi += op.move
+                if pi >= len(tape):
+                    _raise_scan_error()
+
+                found = tape.rfind(b"\0", 0, pi + 1)
+                if found < 0:
+                    _raise_scan_error()
+
+                pi = found
+
+            elif op.code == OPCODE_SCANR:
+                pi += op.move
+                found = tape.find(b"\0", pi)
+                if found < 0:
+                    _raise_scan_error()
+
+                pi = found
+
+            ii += 1
+
+    finally:
+        state.pointer = pi
+
+def _run_counted(opcodes, state, do_read, do_write, stats, max_steps,
+                 time_limit):
+    """
+    Same as _run, but also counts opcodes executed, tracks the highest cell
+    index reached or written, and enforces step & time limits. This is kept
+    separate from _run so that normal runs don't pay for any of it.
+    """
+
+    tape = state.cells
+    pi = state.pointer
+    size = len(opcodes)
+    ii = 0
+    steps = 0
+    high = pi
+
+    deadline = None
+    if time_limit is not None:
+        deadline = time.time() + time_limit
+
+    step_limit = float("inf") if max_steps is None else max_steps
+    next_time_check = _TIME_CHECK_INTERVAL
+
+    try:
+        while ii < size:
+            if steps >= step_limit:
+                raise BrainfuckLimitError("Error: step limit of %d opcodes "
+                    "exceeded" % max_steps)
+
+            if (deadline is not None) and (steps == next_time_check):
+                next_time_check += _TIME_CHECK_INTERVAL
+                if time.time() > deadline:
+                    raise BrainfuckLimitError("Error: time limit of %s "
+                        "seconds exceeded" % time_limit)
+
+            op = opcodes[ii]
+
+            if op.code == OPCODE_MOVE:
+                pi += op.value
+
+            elif op.code == OPCODE_ADD:
+                pi += op.move
+                tape[pi] = (tape[pi] + op.value) % 256
+
+            elif op.code == OPCODE_SUB:
+                pi += op.move
+                tape[pi] = (tape[pi] - op.value) % 256
+
+            elif op.code == OPCODE_OPEN:
+                pi += op.move
+                if tape[pi] == 0:
+                   ii = op.value
+
+            elif op.code == OPCODE_CLOSE:
+                pi += op.move
+                if tape[pi] != 0:
+                    ii = op.value - 1
+
+            elif op.code == OPCODE_INPUT:
+                pi += op.move
+                ch = do_read()
+                if (ch is not None) and (ch > 0):
+                    tape[pi] = ch
+
+            elif op.code == OPCODE_OUTPUT:
+                pi += op.move
+                do_write(tape[pi])
+
+            elif op.code == OPCODE_CLEAR:
+                pi += op.move
+                tape[pi] = 0
+
+            elif op.code == OPCODE_COPY:
+                pi += op.move
+                if tape[pi] > 0:
+                    for off in op.value:
+                        index = pi + off
+                        tape[index] = (tape[index]
+                            + (tape[pi] * op.value[off])) % 256
+                        if index > high:
+                            high = index
+
+                    tape[pi] = 0
+
+            elif op.code == OPCODE_SCANL:
+                pi += op.move
+                if pi >= len(tape):
+                    _raise_scan_error()
+
+                found = tape.rfind(b"\0", 0, pi + 1)
+                if found < 0:
+                    _raise_scan_error()
+
+                pi = found
+
+            elif op.code == OPCODE_SCANR:
+                pi += op.move
+                found = tape.find(b"\0", pi)
+                if found < 0:
+                    _raise_scan_error()
+
+                pi = found
+
+            if pi > high:
+                high = pi
+
+            steps += 1
+            ii += 1
+
+    finally:
+        state.pointer = pi
+        if stats is not None:
+            stats["ops"] = steps
+            stats["max_pointer"] = high
+
+
+def _run_tiered(opcodes, state, do_read, do_write, threshold, stats):
+    """
+    Same as _run, but counts how many times each loop jumps back to its start.
+    Once a loop has done this 'threshold' times, the loop is compiled into a
+    python function (see bfi.compiler) which is used to run the loop from
+    then on.
+    """
+
+    tape = state.cells
+    pi = state.pointer
+    size = len(opcodes)
+    ii = 0
+
+    # Compiled loop functions and back-edge counts, indexed by the position
+    # of the loop's "open" opcode
+    compiled = [None] * size
+    backedges = [0] * size
+    promoted = 0
+    compile_time = 0.0
+
+    try:
+        while ii < size:
+            op = opcodes[ii]
+
+            if op.code == OPCODE_MOVE:
+                pi += op.value
+
+            elif op.code == OPCODE_ADD:
+                pi += op.move
+                tape[pi] = (tape[pi] + op.value) % 256
+
+            elif op.code == OPCODE_SUB:
+                pi += op.move
+                tape[pi] = (tape[pi] - op.value) % 256
+
+            elif op.code == OPCODE_OPEN:
+                pi += op.move
+                loop = compiled[ii]
+                if loop is not None:
+                    pi = loop(tape, pi, do_read, do_write)
+                    ii = op.value
+                elif tape[pi] == 0:
+                   ii = op.value
+
+            elif op.code == OPCODE_CLOSE:
+                pi += op.move
+                if tape[pi] != 0:
+                    start = op.value
+                    backedges[start] += 1
+
+                    if backedges[start] == threshold:
+                        # Only import the compiler if a loop gets hot enough
+                        from bfi.compiler import compile_loop
+
+                        t = time.time()
+                        try:
+                            compiled[start] = compile_loop(opcodes, start)
+                        except ValueError:
+                            pass
+                        else:
+                            promoted += 1
+
+                        compile_time += time.time() - t
+
+                    loop = compiled[start]
+                    if loop is None:
+                        ii = start - 1
+                    else:
+                        # Run the rest of this loop's iterations in the
+                        # compiled function, then carry on after the loop
+                        pi = loop(tape, pi, do_read, do_write)
+
+            elif op.code == OPCODE_INPUT:
+                pi += op.move
+                ch = do_read()
+                if (ch is not None) and (ch > 0):
+                    tape[pi] = ch
+
+            elif op.code == OPCODE_OUTPUT:
+                pi += op.move
+                do_write(tape[pi])
+
+            elif op.code == OPCODE_CLEAR:
+                pi += op.move
+                tape[pi] = 0
+
+            elif op.code == OPCODE_COPY:
+                pi += op.move
+                if tape[pi] > 0:
+                    for off in op.value:
+                        index = pi + off
+                        tape[index] = (tape[index]
+                            + (tape[pi] * op.value[off])) % 256
+
+                    tape[pi] = 0
+
+            elif op.code == OPCODE_SCANL:
+                pi += op.move
+                if pi >= len(tape):
+                    _raise_scan_error()
+
+                found = tape.rfind(b"\0", 0, pi + 1)
+                if found < 0:
+                    _raise_scan_error()
+
+                pi = found
+
+            elif op.code == OPCODE_SCANR:
+                pi += op.move
+                found = tape.find(b"\0", pi)
+                if found < 0:
+                    _raise_scan_error()
+
+                pi = found
+
+            ii += 1
+
+    finally:
+        state.pointer = pi
+        if stats is not None:
+            stats["loops_promoted"] = promoted
+            stats["compile_time"] = compile_time
+
+
+# The cost of looking up a loop in the memo cache is taken to be the same as
+# running _MEMO_LOOKUP_COST opcodes, plus one more for every _MEMO_BYTES_PER_OP
+# cells in the loop's window. Once a memoizable loop has missed the cache
+# _MEMO_PROBE_RUNS times, it stops being memoized if it ran fewer opcodes than
+# a lookup costs, on average, since it would be slower even if it always hit.
+_MEMO_LOOKUP_COST = 32
+_MEMO_BYTES_PER_OP = 16
+_MEMO_PROBE_RUNS = 8
+
+def _loop_window(opcodes, start):
+    """
+    Works out which cells the loop starting at opcodes[start] can read or
+    write, relative to the cell pointer when the loop starts. This is only
+    possible if the loop, and every loop inside it, leaves the cell pointer
+    where it was at the start of each iteration, and contains no input,
+    output or scan loops. Returns a tuple of (lowest, highest) cell offsets,
+    or False if the loop can't be memoized.
+    """
+
+    end = opcodes[start].value
+    if opcodes[start].move != 0:
+        return False
+
+    off = 0
+    low = 0
+    high = 0
+
+    # Pointer offset at the start of each nested loop
+    starts = []
+
+    for ii in range(start + 1, end + 1):
+        op = opcodes[ii]
+
+        if op.code == OPCODE_MOVE:
+            off += op.value
+            continue
+
+        if op.code in (OPCODE_INPUT, OPCODE_OUTPUT, OPCODE_SCANL, OPCODE_SCANR):
+            return False
+
+        off += op.move
+
+        if op.code == OPCODE_OPEN:
+            if op.move != 0:
+                return False
+
+            starts.append(off)
+
+        elif op.code == OPCODE_CLOSE:
+            if off != (starts.pop() if starts else 0):
+                return False
+
+        elif op.code == OPCODE_COPY:
+            for copy_off in op.value:
+                low = min(low, off + copy_off)
+                high = max(high, off + copy_off)
+
+        low = min(low, off)
+        high = max(high, off)
+
+    return low, high
+
+def _run_memo(opcodes, state, do_read, do_write, memo_size, stats):
+    """
+    Same as _run, but memoizes the results of loops that only touch a fixed
+    window of cells around the cell pointer (see _loop_window). When such a
+    loop starts, the contents of its window are looked up in a cache; on a
+    hit, the cached final contents of the window are copied to the tape
+    instead of running the loop. Results are recorded when a loop finishes
+    after a miss. The cache holds 'memo_size' results, and the least recently
+    used result is discarded when it is full.
+    """
+
+    tape = state.cells
+    pi = state.pointer
+    size = len(opcodes)
+    tape_size = len(tape)
+    ii = 0
+
+    # Cell window for each loop, indexed by the position of the loop's "open"
+    # opcode. None if the loop hasn't been analysed yet, False if it can't be
+    # memoized or isn't worth memoizing.
+    windows = [None] * size
+
+    # Misses, and opcodes run after those misses, for each loop
+    runs = [0] * size
+    costs = [0] * size
+
+    cache = collections.OrderedDict()
+
+    # Loops being recorded after a miss, innermost last; each entry is a
+    # tuple of (loop position, cell pointer, cache key, value of 'work' when
+    # the loop started)
+    recording = []
+
+    # Estimate of the number of opcodes run so far. Only updated on each
+    # back-edge, by the size of the loop's body, which is close enough.
+    work = 0
+
+    hits = 0
+    misses = 0
+    evictions = 0
+    skipped = 0
+
+    try:
+        while ii < size:
+            op = opcodes[ii]
+
+            if op.code == OPCODE_MOVE:
+                pi += op.value
+
+            elif op.code == OPCODE_ADD:
+                pi += op.move
+                tape[pi] = (tape[pi] + op.value) % 256
+
+            elif op.code == OPCODE_SUB:
+                pi += op.move
+                tape[pi] = (tape[pi] - op.value) % 256
+
+            elif op.code == OPCODE_OPEN:
+                pi += op.move
+                if tape[pi] == 0:
+                    ii = op.value
+
+                elif (windows[ii] is not False) and not (recording and
+                                                         recording[-1][0] == ii):
+                    # Starting a loop (and not just starting another iteration
+                    # of a loop being recorded) that may be memoizable
+                    window = windows[ii]
+                    if window is None:
+                        window = windows[ii] = _loop_window(opcodes, ii)
+
+                    if window:
+                        low = pi + window[0]
+                        high = pi + window[1] + 1
+
+                        if (low >= 0) and (high <= tape_size):
+                            key = (ii, bytes(tape[low:high]))
+                            result = cache.pop(key, None)
+
+                            if result is None:
+                                misses += 1
+                                recording.append((ii, pi, key, work))
+                            else:
+                                # Re-insert to mark the result as most recently
+                                # used (OrderedDict.move_to_end is python 3 only)
+                                hits += 1
+                                cache[key] = result
+                                tape[low:high] = result
+                                ii = op.value
+
+            elif op.code == OPCODE_CLOSE:
+                pi += op.move
+                if tape[pi] != 0:
+                    work += ii - op.value
+                    ii = op.value - 1
+
+                elif recording and (recording[-1][0] == op.value):
+                    start, entry, key, before = recording.pop()
+                    window = windows[start]
+                    cache[key] = bytes(tape[entry + window[0]:entry + window[1] + 1])
+                    if len(cache) > memo_size:
+                        cache.popitem(last=False)
+                        evictions += 1
+
+                    runs[start] += 1
+                    costs[start] += (work - before) + (ii - start)
+
+                    if runs[start] == _MEMO_PROBE_RUNS:
+                        lookup_cost = _MEMO_LOOKUP_COST + ((window[1] - window[0])
+                                                           // _MEMO_BYTES_PER_OP)
+                        if costs[start] < (lookup_cost * _MEMO_PROBE_RUNS):
+                            windows[start] = False
+                            skipped += 1
+
+            elif op.code == OPCODE_INPUT:
+                pi += op.move
+                ch = do_read()
+                if (ch is not None) and (ch > 0):
+                    tape[pi] = ch
+
+            elif op.code == OPCODE_OUTPUT:
+                pi += op.move
+                do_write(tape[pi])
+
+            elif op.code == OPCODE_CLEAR:
+                pi += op.move
+                tape[pi] = 0
+
+            elif op.code == OPCODE_COPY:
+                pi += op.move
+                if tape[pi] > 0:
+                    for off in op.value:
+                        index = pi + off
+                        tape[index] = (tape[index]
+                            + (tape[pi] * op.value[off])) % 256
+
+                    tape[pi] = 0
+
+            elif op.code == OPCODE_SCANL:
+                pi += op.move
+                if pi >= len(tape):
+                    _raise_scan_error()
+
+                found = tape.rfind(b"\0", 0, pi + 1)
+                if found < 0:
+                    _raise_scan_error()
+
+                pi = found
+
+            elif op.code == OPCODE_SCANR:
+                pi += op.move
+                found = tape.find(b"\0", pi)
+                if found < 0:
+                    _raise_scan_error()
+
+                pi = found
+
+            ii += 1
+
+    finally:
+        state.pointer = pi
+        if stats is not None:
+            stats["memo_hits"] = hits
+            stats["memo_misses"] = misses
+            stats["memo_evictions"] = evictions
+            stats["memo_loops"] = len([w for w in windows if w])
+            stats["memo_skipped"] = skipped
+
+
+def _run_hooked(opcodes, state, do_read, do_write, hooks):
+    """
+    Same as _run, but calls the hooks object (see bfi.debug.Hooks) before
+    each opcode if tracing, when reaching a breakpoint, and when an opcode
+    writes to a watched cell. This is kept separate from _run so that normal
+    runs don't pay for any of it.
+    """
+
+    tape = state.cells
+    pi = state.pointer
+    size = len(opcodes)
+    ii = 0
+
+    hooks.start(tape)
+    breakpoints = hooks.breakpoints
+    watched = hooks.watched
+    tracing = hooks.trace is not None
+
+    try:
+        while ii < size:
+            op = opcodes[ii]
+
+            if tracing:
+                hooks.on_step(ii, pi, tape)
+
+            if ii in breakpoints:
+                hooks.on_breakpoint(ii, pi, tape)
+
+            if op.code == OPCODE_MOVE:
+                pi += op.value
+
+            elif op.code == OPCODE_ADD:
+                pi += op.move
+                tape[pi] = (tape[pi] + op.value) % 256
+                if pi in watched:
+                    hooks.on_write(pi, ii, pi, tape)
+
+            elif op.code == OPCODE_SUB:
+                pi += op.move
+                tape[pi] = (tape[pi] - op.value) % 256
+                if pi in watched:
+                    hooks.on_write(pi, ii, pi, tape)
+
+            elif op.code == OPCODE_OPEN:
+                pi += op.move
+                if tape[pi] == 0:
+                   ii = op.value
+
+            elif op.code == OPCODE_CLOSE:
+                pi += op.move
+                if tape[pi] != 0:
+                    ii = op.value - 1
+
+            elif op.code == OPCODE_INPUT:
+                pi += op.move
+                ch = do_read()
+                if (ch is not None) and (ch > 0):
+                    tape[pi] = ch
+                    if pi in watched:
+                        hooks.on_write(pi, ii, pi, tape)
+
+            elif op.code == OPCODE_OUTPUT:
+                pi += op.move
+                do_write(tape[pi])
+
+            elif op.code == OPCODE_CLEAR:
+                pi += op.move
+                tape[pi] = 0
+                if pi in watched:
+                    hooks.on_write(pi, ii, pi, tape)
+
+            elif op.code == OPCODE_COPY:
+                pi += op.move
+                if tape[pi] > 0:
+                    for off in op.value:
+                        index = pi + off
+                        tape[index] = (tape[index]
+                            + (tape[pi] * op.value[off])) % 256
+
+                        if index in watched:
+                            hooks.on_write(index, ii, pi, tape)
+
+                    tape[pi] = 0
+                    if pi in watched:
+                        hooks.on_write(pi, ii, pi, tape)
+
+            elif op.code == OPCODE_SCANL:
+                pi += op.move
+                if pi >= len(tape):
+                    _raise_scan_error()
+
+                found = tape.rfind(b"\0", 0, pi + 1)
+                if found < 0:
+                    _raise_scan_error()
+
+                pi = found
+
+            elif op.code == OPCODE_SCANR:
+                pi += op.move
+                found = tape.find(b"\0", pi)
+                if found < 0:
+                    _raise_scan_error()
+
+                pi = found
+
+            ii += 1
+
+    finally:
+        state.pointer = pi
+
+def _make_reader(input_data, read_byte):
+    """
+    Returns the function used to read one byte of input; 'read_byte' if it is
+    set, otherwise a function that reads from 'input_data', or from stdin if
+    'input_data' is None
+    """
+
+    if read_byte is not None:
+        return read_byte
+
+    if input_data is None:
+        def read_stdin():
+            ch = os.read(0, 1)
+            if len(ch) == 0:
+                return None
+
+            return ord(ch)
+
+        return read_stdin
+
+    stdin_buf = list(reversed(input_data))
+
+    def read_buf():
+        if len(stdin_buf) > 0:
+            return ord(stdin_buf.pop())
+
+        return None
+
+    return read_buf
+
+def _run_iter(opcodes, tape, do_read, chunk_size, line_buffered):
+    """
+    Same as _run, but a generator which yields output as strings, once
+    'chunk_size' characters of output have accumulated (or at each newline,
+    if 'line_buffered' is True). Execution is paused at each yield. The cell
+    pointer is stored in 'tape' whenever execution pauses, finishes or fails,
+    so the tape can be inspected between chunks.
+    """
+
+    cells = tape.cells
+    pi = tape.pointer
+    size = len(opcodes)
+    ii = 0
+    out = []
+
+    try:
+        while ii < size:
+            op = opcodes[ii]
+
+            if op.code == OPCODE_MOVE:
+                pi += op.value
+
+            elif op.code == OPCODE_ADD:
+                pi += op.move
+                cells[pi] = (cells[pi] + op.value) % 256
+
+            elif op.code == OPCODE_SUB:
+                pi += op.move
+                cells[pi] = (cells[pi] - op.value) % 256
+
+            elif op.code == OPCODE_OPEN:
+                pi += op.move
+                if cells[pi] == 0:
+                   ii = op.value
+
+            elif op.code == OPCODE_CLOSE:
+                pi += op.move
+                if cells[pi] != 0:
+                    ii = op.value - 1
+
+            elif op.code == OPCODE_INPUT:
+                pi += op.move
+                ch = do_read()
+                if (ch is not None) and (ch > 0):
+                    cells[pi] = ch
+
+            elif op.code == OPCODE_OUTPUT:
+                pi += op.move
+                c = cells[pi]
+                out.append(chr(c))
+                if (len(out) >= chunk_size) or (line_buffered and (c == 10)):
+                    tape.pointer = pi
+                    chunk = "".join(out)
+                    del out[:]
+                    yield chunk
+
+            elif op.code == OPCODE_CLEAR:
+                pi += op.move
+                cells[pi] = 0
+
+            elif op.code == OPCODE_COPY:
+                pi += op.move
+                if cells[pi] > 0:
+                    for off in op.value:
+                        index = pi + off
+                        cells[index] = (cells[index]
+                            + (cells[pi] * op.value[off])) % 256
+
+                    cells[pi] = 0
+
+            elif op.code == OPCODE_SCANL:
+                pi += op.move
+                if pi >= len(cells):
+                    _raise_scan_error()
+
+                found = cells.rfind(b"\0", 0, pi + 1)
+                if found < 0:
+                    _raise_scan_error()
+
+                pi = found
+
+            elif op.code == OPCODE_SCANR:
+                pi += op.move
+                found = cells.find(b"\0", pi)
+                if found < 0:
+                    _raise_scan_error()
+
+                pi = found
+
+            ii += 1
+
+    finally:
+        tape.pointer = pi
+
+    if out:
+        yield "".join(out)
+
 def execute(opcodes, input_data=None, tape_size=30000, buffer_output=False,
-            write_byte=None, read_byte=None):
+            write_byte=None, read_byte=None, stats=None, max_steps=None,
+            time_limit=None, tape=None, tiered=False, tier_threshold=100,
+            hooks=None, memoize=False, memo_size=4096):
     """
     Execute a list of intermediate opcodes
 
     :param [Opcode] opcodes: opcodes to execute
     :param str input_data: input data
-    :param int tape_size: Brainfuck program tape size
+    :param int tape_size: Brainfuck program tape size. Ignored if 'tape' is passed.
     :param bool buffer_output: if True, any output generated by the Brainfuck \
         program will be buffered and returned as a string
     :param callable write_byte: callback to implement custom output behaviour; whenever the '.' \
@@ -303,17 +1305,62 @@ def execute(opcodes, input_data=None, tape_size=30000, buffer_output=False,
         brainfuck opcode is used to read input and put it into the current cell, this \
         function will be called to obtain 1 byte of input. Should accept no arguments, \
         and return the read byte as an integer. Overrides the 'input_data' argument.
+    :param dict stats: if not None, execution statistics will be written to this \
+        dict when execution ends; 'ops' is the number of opcodes executed, and \
+        'max_pointer' is the highest cell index reached by the cell pointer, or \
+        written by a copy/multiply loop
+    :param int max_steps: if not None, raise BrainfuckLimitError when the program \
+        tries to execute more than this many opcodes
+    :param float time_limit: if not None, raise BrainfuckLimitError when the program \
+        has been running for more than this many seconds
+    :param Tape tape: if not None, execution starts from the cell contents and \
+        cell pointer of this tape, and the tape is modified in place, so the final \
+        state can be inspected after execution. Use a :class:`MappedTape` to \
+        run on a memory-mapped file. If execution stops because of an exception, \
+        the tape's cell pointer is left where execution stopped (or, in tiered \
+        mode, where the compiled loop that raised the exception started).
+    :param bool tiered: if True, loops which run for more than 'tier_threshold' \
+        iterations are compiled into python functions, which are used to run the \
+        loop from then on. Can't be used with 'max_steps' or 'time_limit'. If \
+        'stats' is not None, 'loops_promoted' is the number of loops that were \
+        compiled, and 'compile_time' is the time spent compiling them, in seconds.
+    :param int tier_threshold: number of iterations before a loop is compiled, \
+        when 'tiered' is True
+    :param bfi.debug.Hooks hooks: if not None, breakpoints, watchpoints and \
+        trace callback to use while executing. 'opcodes' must be the opcodes \
+        created by the Hooks object. Can't be used with 'stats', 'max_steps', \
+        'time_limit' or 'tiered'.
+    :param bool memoize: if True, the results of loops which do no I/O and \
+        only touch a fixed window of cells around the cell pointer are cached, \
+        keyed by the contents of that window, and loops which start with the \
+        same window contents as an earlier run are skipped, copying the cached \
+        result to the tape instead. Loops which are too cheap to be worth \
+        caching are not memoized. Can't be used with 'max_steps', \
+        'time_limit', 'tiered' or 'hooks'. If 'stats' is not None, \
+        'memo_hits', 'memo_misses' and 'memo_evictions' are cache statistics, \
+        'memo_loops' is the number of loops memoized, and 'memo_skipped' is \
+        the number of loops the cost model stopped memoizing.
+    :param int memo_size: maximum number of loop results to cache, when \
+        'memoize' is True. The least recently used result is discarded when \
+        the cache is full.
     """
 
-    stdin_buf = None
-    if input_data != None:
-        stdin_buf = list(reversed(input_data))
+    if tiered and ((max_steps is not None) or (time_limit is not None)):
+        raise ValueError("tiered execution does not support max_steps or time_limit")
+
+    if (hooks is not None) and (tiered or memoize or (stats is not None) or
+                                (max_steps is not None) or (time_limit is not None)):
+        raise ValueError("hooks can't be used with stats, max_steps, time_limit, "
+                         "tiered or memoize")
+
+    if memoize and (tiered or (max_steps is not None) or (time_limit is not None)):
+        raise ValueError("memoized execution does not support max_steps, "
+                         "time_limit or tiered")
+
+    if tape is None:
+        tape = Tape(tape_size)
 
-    tape = bytearray(tape_size)
-    size = len(opcodes)
     ret = []
-    pi = 0
-    ii = 0
 
     # Pre-bind printing function since we'll call it so frequently. This
     # *did* speed things up very slightly in my tests, could have been a
@@ -328,84 +1375,26 @@ def execute(opcodes, input_data=None, tape_size=30000, buffer_output=False,
     def write_buf(c):
         ret.append(chr(c))
 
-    def read_stdin():
-        return ord(os.read(0, 1))
-
-    def read_buf():
-        if len(stdin_buf) > 0:
-            return ord(stdin_buf.pop())
-
-        return None
-
     if write_byte is not None:
         do_write = write_byte
     else:
         do_write = write_buf if buffer_output else write_stdout
 
-    if read_byte is not None:
-        do_read = read_byte
+    do_read = _make_reader(input_data, read_byte)
+
+    # Pick the interpreter loop once, up front, so the common case runs
+    # without any counting or limit checks
+    if hooks is not None:
+        _run_hooked(opcodes, tape, do_read, do_write, hooks)
+    elif memoize:
+        _run_memo(opcodes, tape, do_read, do_write, memo_size, stats)
+    elif tiered:
+        _run_tiered(opcodes, tape, do_read, do_write, tier_threshold, stats)
+    elif (stats is None) and (max_steps is None) and (time_limit is None):
+        _run(opcodes, tape, do_read, do_write)
     else:
-        do_read = read_stdin if stdin_buf is None else read_buf
-
-    while ii < size:
-        op = opcodes[ii]
-
-        if op.code == OPCODE_MOVE:
-            pi += op.value
-
-        elif op.code == OPCODE_ADD:
-            pi += op.move
-            tape[pi] = (tape[pi] + op.value) % 256
-
-        elif op.code == OPCODE_SUB:
-            pi += op.move
-            tape[pi] = (tape[pi] - op.value) % 256
-
-        elif op.code == OPCODE_OPEN:
-            pi += op.move
-            if tape[pi] == 0:
-               ii = op.value
-
-        elif op.code == OPCODE_CLOSE:
-            pi += op.move
-            if tape[pi] != 0:
-                ii = op.value - 1
-
-        elif op.code == OPCODE_INPUT:
-            pi += op.move
-            ch = do_read()
-            if (ch is not None) and (ch > 0):
-                tape[pi] = ch
-
-        elif op.code == OPCODE_OUTPUT:
-            pi += op.move
-            do_write(tape[pi])
-
-        elif op.code == OPCODE_CLEAR:
-            pi += op.move
-            tape[pi] = 0
-
-        elif op.code == OPCODE_COPY:
-            pi += op.move
-            if tape[pi] > 0:
-                for off in op.value:
-                    index = pi + off
-                    tape[index] = (tape[index]
-                        + (tape[pi] * op.value[off])) % 256
-
-                tape[pi] = 0
-
-        elif op.code == OPCODE_SCANL:
-            pi += op.move
-            while pi > 0 and tape[pi] != 0:
-                pi -= 1
-
-        elif op.code == OPCODE_SCANR:
-            pi += op.move
-            while pi < (size - 1) and tape[pi] != 0:
-                pi += 1
-
-        ii += 1
+        _run_counted(opcodes, tape, do_read, do_write, stats, max_steps,
+                     time_limit)
 
     if (not buffer_output) or (write_byte is not None):
         return None
@@ -413,7 +1402,9 @@ def execute(opcodes, input_data=None, tape_size=30000, buffer_output=False,
     return "".join(ret)
 
 def interpret(program, input_data=None, tape_size=30000, buffer_output=False,
-              write_byte=None, read_byte=None):
+              write_byte=None, read_byte=None, opt_level=2, stats=None,
+              max_steps=None, time_limit=None, tiered=False, tier_threshold=100,
+              memoize=False, memo_size=4096):
     """
     Interpret & execute a brainfuck program
 
@@ -431,11 +1422,162 @@ def interpret(program, input_data=None, tape_size=30000, buffer_output=False,
         brainfuck opcode is used to read input and put it into the current cell, this \
         function will be called to obtain 1 byte of input. Should accept no arguments, \
         and return the read byte as an integer. Overrides the 'input_data' argument.
+    :param int opt_level: optimization level to pass to :func:`parse`
+    :param dict stats: if not None, execution statistics will be written to this \
+        dict, see :func:`execute`
+    :param int max_steps: if not None, maximum number of opcodes to execute, see \
+        :func:`execute`
+    :param float time_limit: if not None, maximum execution time in seconds, see \
+        :func:`execute`
+    :param bool tiered: if True, compile frequently-run loops into python \
+        functions, see :func:`execute`
+    :param int tier_threshold: number of iterations before a loop is compiled, \
+        when 'tiered' is True
+    :param bool memoize: if True, cache the results of loops which do no I/O, \
+        see :func:`execute`
+    :param int memo_size: maximum number of loop results to cache, when \
+        'memoize' is True
     """
 
     if not _isstr(program):
         raise BrainfuckSyntaxError("expecting a string containing Brainfuck "
             "code. Got %s instead" % type(program))
 
-    opcodes = parse(program)
-    return execute(opcodes, input_data, tape_size, buffer_output, write_byte, read_byte)
+    opcodes = parse(program, opt_level)
+    return execute(opcodes, input_data, tape_size, buffer_output, write_byte,
+                   read_byte, stats, max_steps, time_limit, tiered=tiered,
+                   tier_threshold=tier_threshold, memoize=memoize,
+                   memo_size=memo_size)
+
+def iter_output(program, input_data=None, tape_size=30000, read_byte=None,
+                opt_level=2, chunk_size=4096, line_buffered=True, tape=None):
+    """
+    Run a brainfuck program lazily, as a generator of output. The program only
+    runs while the caller is asking for output; execution is paused after
+    each chunk is yielded, and resumed when the next chunk is requested. This
+    makes it possible to stream output from programs that never finish:
+
+    ::
+
+        >>> for chunk in bfi.iter_output(program):
+        ...     sock.sendall(chunk.encode("latin-1"))
+
+    Closing the generator (or just discarding it) stops the program, leaving
+    the tape as it was after the last chunk was yielded.
+
+    :param program: Brainfuck source code, or list of opcodes returned by \
+        :func:`parse`
+    :param str input_data: input data
+    :param int tape_size: Brainfuck program tape size. Ignored if 'tape' is passed.
+    :param callable read_byte: callback to implement custom input behaviour, \
+        see :func:`execute`
+    :param int opt_level: optimization level to pass to :func:`parse`, if \
+        'program' is source code
+    :param int chunk_size: maximum number of characters in each chunk of output
+    :param bool line_buffered: if True, output is also yielded at each newline
+    :param Tape tape: if not None, execution starts from the cell contents and \
+        cell pointer of this tape, and the tape is modified in place
+    :return: generator which yields output as strings
+    """
+
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+
+    # Parse here rather than in the generator, so syntax errors are raised
+    # straight away instead of on the first request for output
+    if _isstr(program):
+        opcodes = parse(program, opt_level)
+    else:
+        opcodes = program
+
+    if tape is None:
+        tape = Tape(tape_size)
+
+    return _run_iter(opcodes, tape, _make_reader(input_data, read_byte),
+                     chunk_size, line_buffered)
+
+class Session(object):
+    """
+    Runs brainfuck code a piece at a time, keeping the tape and cell pointer
+    from one piece to the next. Only the new piece of code is parsed and
+    executed each time, so the cost of each piece does not depend on how much
+    code came before it.
+
+    If a piece of code opens a loop without closing it, the code is kept
+    until the loop is closed by a later piece, and then executed all at once.
+
+    :param int tape_size: Brainfuck program tape size
+    :param int opt_level: optimization level to pass to :func:`parse`
+    :param callable write_byte: callback to implement custom output behaviour, \
+        see :func:`execute`. If None, output is returned by :meth:`feed`.
+    :param callable read_byte: callback to implement custom input behaviour, \
+        see :func:`execute`. If None, input is read from stdin unless passed \
+        to :meth:`feed`.
+    """
+
+    def __init__(self, tape_size=30000, opt_level=2, write_byte=None,
+                 read_byte=None):
+        self.tape = Tape(tape_size)
+        self.opt_level = opt_level
+        self.write_byte = write_byte
+        self.read_byte = read_byte
+        self._pending = []
+        self._depth = 0
+
+    @property
+    def pending(self):
+        """
+        True if code containing an unclosed loop is waiting to be executed
+        """
+
+        return len(self._pending) > 0
+
+    def reset(self):
+        """
+        Clear the tape, move the cell pointer back to 0, and discard any code
+        waiting to be executed
+        """
+
+        self.tape = Tape(len(self.tape))
+        self._pending = []
+        self._depth = 0
+
+    def feed(self, code, input_data=None):
+        """
+        Execute a piece of brainfuck code, starting from the tape and cell pointer
+        left by the previous piece
+
+        :param str code: Brainfuck source code
+        :param str input_data: input data for this piece of code
+        :raises BrainfuckSyntaxError: if the code contains an unmatched ']' \
+            symbol. Any code waiting to be executed is discarded.
+        :return: output generated by the code, or None if a 'write_byte' \
+            callback was provided
+        :rtype: str
+        """
+
+        if not _isstr(code):
+            raise BrainfuckSyntaxError("expecting a string containing Brainfuck "
+                "code. Got %s instead" % type(code))
+
+        for c in code:
+            if c == "[":
+                self._depth += 1
+            elif c == "]":
+                self._depth -= 1
+                if self._depth < 0:
+                    self._pending = []
+                    self._depth = 0
+                    _raise_unmatched("]")
+
+        self._pending.append(code)
+        if self._depth > 0:
+            return None if self.write_byte is not None else ""
+
+        program = "".join(self._pending)
+        self._pending = []
+
+        opcodes = parse(program, self.opt_level)
+        return execute(opcodes, input_data, buffer_output=True,
+                       write_byte=self.write_byte, read_byte=self.read_byte,
+                       tape=self.tape)
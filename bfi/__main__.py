@@ -0,0 +1,274 @@
+import os
+import sys
+import time
+import argparse
+
+import bfi
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "examples")
+
+# Buffered output is flushed once this many bytes have accumulated
+OUTPUT_BUFFER_SIZE = 4096
+
+class _Output(object):
+    """
+    Output for the Brainfuck program, written to stdout either as text (the
+    default) or as raw bytes, and either flushed after every byte or buffered
+    """
+
+    def __init__(self, binary=False, buffered=False):
+        if binary:
+            # Python 2x has no separate binary stdout
+            stream = getattr(sys.stdout, "buffer", sys.stdout)
+            self._convert = lambda data: bytes(data)
+        else:
+            stream = sys.stdout
+            self._convert = lambda data: data.decode("latin-1")
+
+        self._write = stream.write
+        self._flush = stream.flush
+        self._buf = bytearray()
+        self.write_byte = self._write_buffered if buffered else self._write_unbuffered
+
+    def _write_unbuffered(self, c):
+        self._write(self._convert(bytearray((c,))))
+        self._flush()
+
+    def _write_buffered(self, c):
+        self._buf.append(c)
+        if len(self._buf) >= OUTPUT_BUFFER_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self._buf:
+            self._write(self._convert(self._buf))
+            del self._buf[:]
+
+        self._flush()
+
+# Labels and formats for each execution statistic, in the order they are printed
+_STATS_FORMATS = [
+    ("ops", "ops executed: %d"),
+    ("max_pointer", "tape high-water mark: %d"),
+    ("loops_promoted", "loops compiled: %d"),
+    ("compile_time", "compile time: %.6f secs"),
+    ("memo_hits", "memo hits: %d"),
+    ("memo_misses", "memo misses: %d"),
+    ("memo_evictions", "memo evictions: %d"),
+    ("memo_loops", "loops memoized: %d"),
+    ("memo_skipped", "loops too cheap to memoize: %d"),
+]
+
+def _print_stats(stats):
+    for key, fmt in _STATS_FORMATS:
+        if key in stats:
+            sys.stderr.write((fmt % stats[key]) + "\n")
+
+def _list_examples():
+    for name in sorted(os.listdir(EXAMPLES_DIR), key=lambda n: n.lower()):
+        print(os.path.join(EXAMPLES_DIR, name))
+
+def _repl(args):
+    """
+    Read brainfuck code from stdin a line at a time, and execute each line as
+    soon as any loops in it are closed, keeping the tape between lines
+    """
+
+    def read_byte():
+        ch = sys.stdin.read(1)
+        if len(ch) == 0:
+            return None
+
+        return ord(ch)
+
+    session = bfi.Session(args.tape_size, args.opt_level, read_byte=read_byte)
+    sys.stdout.write("bfi %s, enter brainfuck code. Ctrl-D to exit.\n" % bfi.__version__)
+
+    while True:
+        sys.stdout.write("... " if session.pending else "bfi> ")
+        sys.stdout.flush()
+
+        line = sys.stdin.readline()
+        if len(line) == 0:
+            sys.stdout.write("\n")
+            break
+
+        try:
+            out = session.feed(line)
+        except bfi.BrainfuckSyntaxError as e:
+            sys.stdout.write("%s\n" % e)
+            continue
+        except IndexError:
+            sys.stdout.write("Error: cell pointer moved outside of tape\n")
+            continue
+        except KeyboardInterrupt:
+            sys.stdout.write("\n")
+            continue
+
+        if out:
+            sys.stdout.write(out)
+            if not out.endswith("\n"):
+                sys.stdout.write("\n")
+
+    return 0
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(prog="bfi",
+        description="Fast optimizing Brainfuck interpreter. Run 'bfi serve -h' "
+                    "for help with running bfi as a server")
+
+    parser.add_argument("program", nargs="?", default=None,
+        help="Brainfuck source file to run")
+    parser.add_argument("-e", "--examples", action="store_true",
+        help="Show paths of all installed example Brainfuck programs, and exit")
+    parser.add_argument("--repl", action="store_true",
+        help="Read Brainfuck code interactively, keeping the tape between lines")
+    parser.add_argument("-t", "--tape-size", type=int, default=None,
+        help="Number of cells on the tape (default: the size of --tape-file, "
+             "if given, otherwise 30000)")
+    parser.add_argument("--tape-file", default=None,
+        help="Memory-map the tape onto this file. The program starts with the "
+             "file's contents on the tape (the file is created if it doesn't "
+             "exist), and the final tape is left in the file")
+    parser.add_argument("-O", "--opt-level", type=int, choices=[0, 1, 2], default=2,
+        help="Optimization level (default: %(default)s)")
+    parser.add_argument("--dump-ir", action="store_true",
+        help="Print the intermediate opcodes for the program, and exit")
+    parser.add_argument("--time", action="store_true",
+        help="Print time spent parsing and executing the program to stderr")
+    parser.add_argument("--stats", action="store_true",
+        help="Print execution statistics to stderr. With --tiered or --memoize, "
+             "opcodes executed and the tape high-water mark are not counted, and "
+             "statistics for the loop compiler or memo cache are printed instead")
+    parser.add_argument("--max-steps", type=int, default=None,
+        help="Stop the program after executing this many opcodes")
+    parser.add_argument("--time-limit", type=float, default=None,
+        help="Stop the program after running for this many seconds")
+    parser.add_argument("--tiered", action="store_true",
+        help="Compile frequently-run loops into python functions while the "
+             "program is running. Can't be used with --max-steps or --time-limit")
+    parser.add_argument("--tier-threshold", type=int, default=100,
+        help="Number of iterations before a loop is compiled, with --tiered "
+             "(default: %(default)s)")
+    parser.add_argument("--memoize", action="store_true",
+        help="Cache the results of loops that do no I/O and only touch nearby "
+             "cells, and skip loops that start with the same cell contents as "
+             "an earlier run. Can't be used with --tiered, --max-steps or "
+             "--time-limit")
+    parser.add_argument("--memo-size", type=int, default=4096,
+        help="Maximum number of loop results to cache, with --memoize "
+             "(default: %(default)s)")
+    parser.add_argument("-b", "--binary", action="store_true",
+        help="Write output as raw bytes instead of text")
+    parser.add_argument("--buffered", action="store_true",
+        help="Buffer output instead of flushing after every byte. Buffered "
+             "output is still flushed before reading input")
+
+    args = parser.parse_args(argv)
+    if (args.program is None) and (not args.examples) and (not args.repl):
+        parser.error("no Brainfuck source file provided")
+
+    # A tape file keeps its own size unless a size is given
+    if (args.tape_size is None) and (args.repl or (args.tape_file is None)):
+        args.tape_size = 30000
+
+    if args.tiered and ((args.max_steps is not None) or (args.time_limit is not None)):
+        parser.error("--tiered can't be used with --max-steps or --time-limit")
+
+    if args.memoize and (args.tiered or (args.max_steps is not None) or
+                         (args.time_limit is not None)):
+        parser.error("--memoize can't be used with --tiered, --max-steps or "
+                     "--time-limit")
+
+    return args
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    if argv and (argv[0] == "serve"):
+        # Only import the server (and everything it needs) when it's used
+        from bfi.server import main as serve_main
+        return serve_main(argv[1:])
+
+    args = _parse_args(argv)
+
+    if args.examples:
+        _list_examples()
+        return 0
+
+    if args.repl:
+        return _repl(args)
+
+    with open(args.program, "r") as fh:
+        program = fh.read()
+
+    start = time.time()
+    try:
+        opcodes = bfi.parse(program, args.opt_level)
+    except bfi.BrainfuckSyntaxError as e:
+        sys.stderr.write("%s\n" % e)
+        return 1
+
+    parse_time = time.time() - start
+
+    if args.dump_ir:
+        for op in opcodes:
+            print(op)
+
+        return 0
+
+    output = _Output(args.binary, args.buffered)
+
+    def read_byte():
+        output.flush()
+        ch = os.read(0, 1)
+        if len(ch) == 0:
+            return None
+
+        return ord(ch)
+
+    stats = {} if args.stats else None
+    ret = 0
+
+    tape = None
+    if args.tape_file is not None:
+        try:
+            tape = bfi.MappedTape(args.tape_size, args.tape_file)
+        except (ValueError, IOError, OSError) as e:
+            sys.stderr.write("Error: %s\n" % e)
+            return 1
+
+    start = time.time()
+    try:
+        bfi.execute(opcodes, tape_size=args.tape_size, write_byte=output.write_byte,
+                    read_byte=read_byte, stats=stats, max_steps=args.max_steps,
+                    time_limit=args.time_limit, tiered=args.tiered,
+                    tier_threshold=args.tier_threshold, tape=tape,
+                    memoize=args.memoize, memo_size=args.memo_size)
+    except bfi.BrainfuckLimitError as e:
+        sys.stderr.write("\n%s\n" % e)
+        ret = 1
+    except IndexError:
+        sys.stderr.write("\nError: cell pointer moved outside of tape\n")
+        ret = 1
+    except KeyboardInterrupt:
+        ret = 130
+    finally:
+        output.flush()
+        if tape is not None:
+            tape.close()
+
+    exec_time = time.time() - start
+
+    if args.time:
+        sys.stderr.write("parse time:   %.6f secs\n" % parse_time)
+        sys.stderr.write("execute time: %.6f secs\n" % exec_time)
+
+    if stats is not None:
+        _print_stats(stats)
+
+    return ret
+
+if __name__ == "__main__":
+    sys.exit(main())
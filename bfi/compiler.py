@@ -0,0 +1,173 @@
+"""
+Compiles loops of intermediate opcodes into specialized python functions.
+
+Used by the tiered execution mode of :func:`bfi.execute`; loops start out
+running in the normal interpreter loop, and once a loop has executed enough
+iterations, it (along with any loops nested inside it) is compiled into a
+python function which is used every time the loop runs from then on.
+
+Compiled code avoids the per-opcode dispatch of the interpreter loop
+entirely, and keeps pointer movement inside straight-line sections of code as
+constant offsets, so something like ``>+>+<<-`` becomes three tape updates and
+no pointer updates at all.
+"""
+
+import bfi
+from bfi import (OPCODE_MOVE, OPCODE_ADD, OPCODE_SUB, OPCODE_OPEN,
+                 OPCODE_INPUT, OPCODE_OUTPUT, OPCODE_CLEAR, OPCODE_COPY,
+                 OPCODE_SCANL, OPCODE_SCANR)
+
+
+class _CodeWriter(object):
+    def __init__(self):
+        self.lines = []
+
+    def emit(self, indent, line):
+        self.lines.append(("    " * indent) + line)
+
+def _cell(off):
+    if off == 0:
+        return "tape[pi]"
+
+    return "tape[pi + %d]" % off
+
+def _flush(writer, indent, off):
+    if off != 0:
+        writer.emit(indent, "pi += %d" % off)
+
+    return 0
+
+def _compile_body(writer, opcodes, ii, end, indent):
+    """
+    Write python code for opcodes[ii:end], which should be the body of a loop
+    (the opcodes between the "open" and "close"). Returns the pending pointer
+    offset which has not yet been added to 'pi'.
+    """
+
+    off = 0
+    start_len = len(writer.lines)
+
+    while ii < end:
+        op = opcodes[ii]
+        code = op.code
+
+        if code == OPCODE_MOVE:
+            off += op.value
+
+        elif code == OPCODE_ADD:
+            off += op.move
+            cell = _cell(off)
+            writer.emit(indent, "%s = (%s + %d) & 255" % (cell, cell, op.value))
+
+        elif code == OPCODE_SUB:
+            off += op.move
+            cell = _cell(off)
+            writer.emit(indent, "%s = (%s - %d) & 255" % (cell, cell, op.value))
+
+        elif code == OPCODE_OPEN:
+            _compile_loop(writer, opcodes, ii, indent, off + op.move)
+            off = 0
+            ii = op.value
+
+        elif code == OPCODE_INPUT:
+            off += op.move
+            writer.emit(indent, "ch = do_read()")
+            writer.emit(indent, "if (ch is not None) and (ch > 0):")
+            writer.emit(indent + 1, "%s = ch" % _cell(off))
+
+        elif code == OPCODE_OUTPUT:
+            off += op.move
+            writer.emit(indent, "do_write(%s)" % _cell(off))
+
+        elif code == OPCODE_CLEAR:
+            off += op.move
+            writer.emit(indent, "%s = 0" % _cell(off))
+
+        elif code == OPCODE_COPY:
+            off += op.move
+            writer.emit(indent, "v = %s" % _cell(off))
+            writer.emit(indent, "if v:")
+            for dest in op.value:
+                cell = _cell(off + dest)
+                writer.emit(indent + 1, "%s = (%s + (v * %d)) & 255"
+                    % (cell, cell, op.value[dest]))
+
+            writer.emit(indent + 1, "%s = 0" % _cell(off))
+
+        elif code == OPCODE_SCANL:
+            off = _flush(writer, indent, off + op.move)
+            writer.emit(indent, "if pi >= len(tape):")
+            writer.emit(indent + 1, "raise_scan_error()")
+            writer.emit(indent, 'pi = tape.rfind(b"\\0", 0, pi + 1)')
+            writer.emit(indent, "if pi < 0:")
+            writer.emit(indent + 1, "raise_scan_error()")
+
+        elif code == OPCODE_SCANR:
+            off = _flush(writer, indent, off + op.move)
+            writer.emit(indent, 'pi = tape.find(b"\\0", pi)')
+            writer.emit(indent, "if pi < 0:")
+            writer.emit(indent + 1, "raise_scan_error()")
+
+        else:
+            raise ValueError("can't compile opcode %s" % op)
+
+        ii += 1
+
+    if len(writer.lines) == start_len:
+        writer.emit(indent, "pass")
+
+    return off
+
+def _compile_loop(writer, opcodes, start, indent, off):
+    # Loops are entered with no pending pointer offset, so that every
+    # iteration of the loop starts from the same place
+    open_op = opcodes[start]
+    close_op = opcodes[open_op.value]
+
+    if open_op.move != 0:
+        raise ValueError("can't compile loop with non-zero entry movement")
+
+    _flush(writer, indent, off)
+    writer.emit(indent, "while tape[pi]:")
+    body_off = _compile_body(writer, opcodes, start + 1, open_op.value, indent + 1)
+    _flush(writer, indent + 1, body_off + close_op.move)
+
+def compile_loop(opcodes, start):
+    """
+    Compile a loop, and any loops nested inside it, into a python function
+
+    The returned function should be called with the tape, the cell pointer, and
+    read/write callbacks (as described for :func:`bfi.execute`) when the
+    interpreter reaches the "open" opcode at 'start' (or the matching "close"
+    opcode, if the loop is about to go round again). It runs the loop until it
+    exits, and returns the new cell pointer value; execution should then
+    continue from the opcode after the matching "close" opcode.
+
+    :param [Opcode] opcodes: intermediate opcodes, as returned by :func:`bfi.parse`
+    :param int start: index of the "open" opcode for the loop to compile
+    :raises ValueError: if the loop can't be compiled
+    :return: compiled loop function
+    :rtype: callable
+    """
+
+    if opcodes[start].code != OPCODE_OPEN:
+        raise ValueError("opcode at index %d is not a loop" % start)
+
+    writer = _CodeWriter()
+    writer.emit(0, "def loop(tape, pi, do_read, do_write):")
+    _compile_loop(writer, opcodes, start, 1, 0)
+    writer.emit(1, "return pi")
+
+    namespace = {"raise_scan_error": bfi._raise_scan_error}
+
+    try:
+        code = compile("\n".join(writer.lines) + "\n", "<bfi loop %d>" % start,
+                       "exec")
+    except (SyntaxError, RuntimeError, MemoryError) as e:
+        # Python limits how deeply blocks can be nested, so very deeply nested
+        # loops can't be compiled. Catch RuntimeError rather than RecursionError
+        # (a subclass of it), which doesn't exist in python 2.7
+        raise ValueError("can't compile loop: %s" % e)
+
+    exec(code, namespace)
+    return namespace["loop"]
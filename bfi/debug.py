@@ -0,0 +1,339 @@
+"""
+Breakpoints, watchpoints and tracing for brainfuck programs.
+
+Create a :class:`Hooks` object for a program, add breakpoints, watchpoints or a
+trace callback to it, and run the program with :meth:`Hooks.run`:
+
+::
+
+    >>> import bfi.debug
+    >>> hooks = bfi.debug.Hooks(program)
+    >>> hooks.add_breakpoint(12, 5, lambda event: print(event))
+    >>> hooks.add_watchpoint(3, lambda event: print(event))
+    >>> hooks.run(buffer_output=True)
+
+All callbacks are passed a :class:`HookEvent`. A callback can stop execution by
+raising an exception, which will be propagated by :meth:`Hooks.run`.
+
+Hooks are handled by a separate interpreter loop, chosen once when execution
+starts, so programs run without hooks don't pay anything for them. Run
+``python -m bfi.debug`` to measure the overhead of each type of hook.
+"""
+
+import sys
+import time
+import bisect
+import argparse
+
+import bfi
+
+
+class HookEvent(object):
+    """
+    Passed to breakpoint, watchpoint and trace callbacks
+
+    :ivar str kind: "step", "breakpoint" or "watchpoint"
+    :ivar int index: index of the current opcode
+    :ivar bfi.Opcode opcode: the current opcode
+    :ivar int pointer: cell pointer value. For "step" and "breakpoint" events, \
+        this is the value before the current opcode is executed
+    :ivar bytearray tape: the tape. Changes made to the tape will be seen by \
+        the program
+    :ivar int line: source line of the current opcode, starting from 1
+    :ivar int column: source column of the current opcode, starting from 1
+    :ivar int cell: for "watchpoint" events, the watched cell that changed
+    :ivar int old: for "watchpoint" events, the previous value of the cell
+    :ivar int new: for "watchpoint" events, the new value of the cell
+    """
+
+    def __init__(self, hooks, kind, index, pointer, tape, cell=None, old=None,
+                 new=None):
+        self.kind = kind
+        self.index = index
+        self.opcode = hooks.opcodes[index]
+        self.pointer = pointer
+        self.tape = tape
+        self.line, self.column = hooks.location(index)
+        self.cell = cell
+        self.old = old
+        self.new = new
+
+    def __str__(self):
+        ret = "%s at line %d, column %d (%s), cell pointer %d" % (self.kind,
+            self.line, self.column, self.opcode, self.pointer)
+
+        if self.kind == "watchpoint":
+            ret += ", cell %d changed from %d to %d" % (self.cell, self.old, self.new)
+
+        return ret
+
+class Hooks(object):
+    """
+    Breakpoints, watchpoints and trace callback for one brainfuck program
+
+    :param str program: Brainfuck source code
+    :param int opt_level: optimization level to pass to :func:`bfi.parse`. Lower \
+        levels give more precise source locations.
+    """
+
+    def __init__(self, program, opt_level=2):
+        self.program = program
+        self.positions = []
+        self.opcodes = bfi.parse(program, opt_level, positions=self.positions)
+        self._starts = [start for start, end in self.positions]
+        self._line_starts = [0] + [i + 1 for i, c in enumerate(program) if c == "\n"]
+
+        # Opcode index -> list of callbacks
+        self.breakpoints = {}
+
+        # Cell -> callback, and cell -> last value seen
+        self.watchpoints = {}
+        self.watched = {}
+
+        self.trace = None
+
+    def location(self, index):
+        """
+        Get the source location of an opcode
+
+        :param int index: opcode index
+        :return: tuple of (line, column), both starting from 1
+        :rtype: (int, int)
+        """
+
+        offset = self.positions[index][0]
+        line = bisect.bisect_right(self._line_starts, offset) - 1
+        return line + 1, (offset - self._line_starts[line]) + 1
+
+    def opcode_at(self, line, column):
+        """
+        Find the opcode for a source location. This is the opcode whose source
+        code contains the location or, if no opcode does (for example, the
+        location is in a comment), the first opcode after it.
+
+        :param int line: source line, starting from 1
+        :param int column: source column, starting from 1
+        :raises ValueError: if there is no code at or after the location
+        :return: opcode index
+        :rtype: int
+        """
+
+        if (line < 1) or (line > len(self._line_starts)) or (column < 1):
+            raise ValueError("invalid source location %d:%d" % (line, column))
+
+        offset = self._line_starts[line - 1] + (column - 1)
+        index = bisect.bisect_right(self._starts, offset) - 1
+
+        if (index >= 0) and (offset < self.positions[index][1]):
+            return index
+
+        if (index + 1) < len(self.opcodes):
+            return index + 1
+
+        raise ValueError("no code at or after %d:%d" % (line, column))
+
+    def add_breakpoint(self, line, column, callback):
+        """
+        Call 'callback' every time execution reaches a source location, before
+        the code at that location is executed
+
+        :param int line: source line, starting from 1
+        :param int column: source column, starting from 1
+        :param callable callback: called with a :class:`HookEvent`
+        :return: index of the opcode the breakpoint was placed on
+        :rtype: int
+        """
+
+        index = self.opcode_at(line, column)
+        self.breakpoints.setdefault(index, []).append(callback)
+        return index
+
+    def remove_breakpoint(self, line, column):
+        """
+        Remove all breakpoints at a source location
+
+        :param int line: source line, starting from 1
+        :param int column: source column, starting from 1
+        """
+
+        self.breakpoints.pop(self.opcode_at(line, column), None)
+
+    def add_watchpoint(self, cell, callback):
+        """
+        Call 'callback' every time the value of a cell changes
+
+        :param int cell: cell index
+        :param callable callback: called with a :class:`HookEvent`
+        """
+
+        if cell < 0:
+            raise ValueError("invalid cell index %d" % cell)
+
+        self.watchpoints[cell] = callback
+        self.watched[cell] = 0
+
+    def remove_watchpoint(self, cell):
+        """
+        Remove the watchpoint on a cell
+
+        :param int cell: cell index
+        """
+
+        self.watchpoints.pop(cell, None)
+        self.watched.pop(cell, None)
+
+    def set_trace(self, callback):
+        """
+        Call 'callback' before every opcode is executed
+
+        :param callable callback: called with a :class:`HookEvent`, or None to \
+            stop tracing
+        """
+
+        self.trace = callback
+
+    def run(self, *args, **kwargs):
+        """
+        Execute the program with these hooks. Accepts the same arguments as
+        :func:`bfi.execute`, except for 'opcodes' and 'hooks'.
+        """
+
+        return bfi.execute(self.opcodes, *args, hooks=self, **kwargs)
+
+    # The following methods are called by the interpreter loop
+
+    def start(self, tape):
+        for cell in self.watched:
+            if cell >= len(tape):
+                raise ValueError("watched cell %d is outside of tape" % cell)
+
+            self.watched[cell] = tape[cell]
+
+    def on_step(self, index, pointer, tape):
+        self.trace(HookEvent(self, "step", index, pointer, tape))
+
+    def on_breakpoint(self, index, pointer, tape):
+        event = HookEvent(self, "breakpoint", index, pointer, tape)
+        for callback in self.breakpoints[index]:
+            callback(event)
+
+    def on_write(self, cell, index, pointer, tape):
+        old = self.watched[cell]
+        new = tape[cell]
+        if new != old:
+            self.watched[cell] = new
+            self.watchpoints[cell](HookEvent(self, "watchpoint", index, pointer,
+                                             tape, cell, old, new))
+
+# CPU time is less affected by other processes than wall clock time, where
+# it's available (python 3.3+)
+_timer = getattr(time, "process_time", time.time)
+
+# Each timed sample runs a configuration enough times to take at least this
+# many seconds, so short programs aren't lost in timer noise
+_MIN_SAMPLE_TIME = 0.1
+
+# All configurations are run, untimed, for at least this many seconds before
+# timing starts; CPU speed can take a while to settle
+_WARMUP_TIME = 1.0
+
+def measure_overhead(program, input_data=None, repeat=5):
+    """
+    Measure how much slower a program runs with each type of hook, compared
+    to plain :func:`bfi.execute`. Callbacks do nothing, so this measures only
+    the cost of the hooks themselves. The breakpoint is placed on the first
+    opcode of the program, and the watchpoint on cell 0.
+
+    :param str program: Brainfuck source code
+    :param str input_data: input data
+    :param int repeat: number of timed samples for each configuration; the \
+        fastest is used. Each sample runs the program as many times as it \
+        takes to fill at least 0.1 seconds.
+    :return: list of (name, seconds, ratio) tuples, where 'ratio' is the time \
+        relative to plain execution
+    :rtype: [(str, float, float)]
+    """
+
+    def nothing(event):
+        pass
+
+    opcodes = bfi.parse(program)
+
+    none = Hooks(program)
+
+    breakpoint = Hooks(program)
+    line, column = breakpoint.location(0)
+    breakpoint.add_breakpoint(line, column, nothing)
+
+    watchpoint = Hooks(program)
+    watchpoint.add_watchpoint(0, nothing)
+
+    trace = Hooks(program)
+    trace.set_trace(nothing)
+
+    configs = [
+        ("plain execute()", lambda: bfi.execute(opcodes, input_data, buffer_output=True)),
+        ("hooks, none set", lambda: none.run(input_data, buffer_output=True)),
+        ("breakpoint", lambda: breakpoint.run(input_data, buffer_output=True)),
+        ("watchpoint", lambda: watchpoint.run(input_data, buffer_output=True)),
+        ("trace", lambda: trace.run(input_data, buffer_output=True)),
+    ]
+
+    # Untimed warm-up runs of each configuration first, so that the first
+    # configuration doesn't pay for filling caches or for the CPU speeding
+    # up. The slowest warm-up run decides how many times to run each
+    # configuration per sample.
+    warmup_end = _timer() + _WARMUP_TIME
+    while True:
+        slowest = 0.0
+        for name, func in configs:
+            start = _timer()
+            func()
+            slowest = max(slowest, _timer() - start)
+
+        if _timer() >= warmup_end:
+            break
+
+    number = max(1, int(_MIN_SAMPLE_TIME / max(slowest, 1e-6)))
+
+    # Take turns running each configuration, starting with a different one in
+    # each round, so that anything else happening on the machine affects them
+    # all equally
+    best = [None] * len(configs)
+    for r in range(repeat):
+        order = list(range(len(configs)))
+        order = order[r % len(order):] + order[:r % len(order)]
+        for i in order:
+            func = configs[i][1]
+            start = _timer()
+            for _ in range(number):
+                func()
+
+            elapsed = (_timer() - start) / number
+            if (best[i] is None) or (elapsed < best[i]):
+                best[i] = elapsed
+
+    return [(name, best[i], best[i] / best[0])
+            for i, (name, func) in enumerate(configs)]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bfi.debug",
+        description="Measure the overhead of breakpoints, watchpoints and "
+                    "tracing when running a brainfuck program")
+    parser.add_argument("program", help="Brainfuck source file to run")
+    parser.add_argument("-i", "--input", default="",
+        help="Input data for the program")
+    parser.add_argument("-r", "--repeat", type=int, default=5,
+        help="Number of times to run each configuration (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    with open(args.program, "r") as fh:
+        program = fh.read()
+
+    for name, elapsed, ratio in measure_overhead(program, args.input, args.repeat):
+        print("%-20s %10.4f secs %8.2fx" % (name, elapsed, ratio))
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
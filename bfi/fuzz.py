@@ -0,0 +1,357 @@
+"""
+Differential fuzzer for the optimizing interpreter.
+
+Generates random brainfuck programs that lean heavily on the constructs that
+:func:`bfi.parse` tries to optimize (clear loops, copy/multiply loops, scan
+loops and nested loops, along with near-misses of each), runs them with the
+naive interpreter in :mod:`bfi.reference` and with :func:`bfi.execute` at
+every optimization level and in each execution mode, and compares the final
+tape, cell pointer and output. Any program that gives different results is
+minimized before being reported.
+
+Run from the command line with ``python -m bfi.fuzz``.
+"""
+
+import sys
+import random
+import argparse
+
+import bfi
+import bfi.debug
+from bfi import reference
+
+
+# Engine configurations to compare against the reference interpreter. Each
+# entry is (name, keyword args for parse(), keyword args for execute()). Two
+# extra keys select the other interpreter loops: "hooks": True runs with a
+# trace callback and a watchpoint set (see _make_hooks), and "iter_output"
+# runs the program with iter_output() instead, passing it the given dict of
+# keyword args.
+CONFIGS = [
+    ("O0", {"opt_level": 0}, {}),
+    ("O1", {"opt_level": 1}, {}),
+    ("O2", {"opt_level": 2}, {}),
+    ("O2 tiered", {"opt_level": 2}, {"tiered": True, "tier_threshold": 1}),
+    ("O2 tiered (3)", {"opt_level": 2}, {"tiered": True, "tier_threshold": 3}),
+    ("O2 memoized", {"opt_level": 2}, {"memoize": True, "memo_size": 4}),
+    ("O2 hooked", {"opt_level": 2}, {"hooks": True}),
+    ("O2 iter_output", {"opt_level": 2}, {"iter_output": {"chunk_size": 1}}),
+]
+
+TAPE_SIZES = [8, 32, 300]
+
+class FuzzFailure(object):
+    """
+    A program for which one or more engine configurations disagreed with the
+    reference interpreter
+    """
+
+    def __init__(self, program, input_data, tape_size, mismatches):
+        self.program = program
+        self.input_data = input_data
+        self.tape_size = tape_size
+        self.mismatches = mismatches
+
+    def __str__(self):
+        lines = [
+            "program:   %r" % self.program,
+            "input:     %r" % self.input_data,
+            "tape size: %d" % self.tape_size,
+        ]
+
+        lines.extend(["  " + m for m in self.mismatches])
+        return "\n".join(lines)
+
+def _gen_copyloop(rng):
+    # Copy/multiply loop moving to the right, e.g. "[->++>>+++<<<]"
+    ret = "[-"
+    depth = 0
+    for _ in range(rng.randint(1, 3)):
+        move = rng.randint(1, 3)
+        ret += (">" * move) + ("+" * rng.randint(1, 4))
+        depth += move
+
+    ret += "<" * depth
+
+    # Occasionally produce something that looks like a copy loop but isn't
+    # balanced, or decrements by the wrong amount
+    choice = rng.random()
+    if choice < 0.1:
+        ret += "<"
+    elif choice < 0.2:
+        ret = ret.replace("[-", "[--", 1)
+    elif choice < 0.3:
+        ret = ret.replace("<", "-<", 1)
+
+    return ret + "]"
+
+def _gen_loop(rng, depth):
+    body = _gen_sequence(rng, rng.randint(1, 4), depth + 1)
+
+    # Decrement the loop cell at the end of most loops, so that a reasonable
+    # number of them actually terminate
+    if rng.random() < 0.8:
+        body += "-"
+
+    return "[" + body + "]"
+
+def _gen_fragment(rng, depth):
+    choice = rng.random()
+
+    if choice < 0.2:
+        return rng.choice("+-") * rng.randint(1, 12)
+    elif choice < 0.35:
+        return rng.choice("<>") * rng.randint(1, 4)
+    elif choice < 0.42:
+        return "."
+    elif choice < 0.46:
+        return ","
+    elif choice < 0.56:
+        return rng.choice(["[-]", "[+]"])
+    elif choice < 0.68:
+        return _gen_copyloop(rng)
+    elif choice < 0.76:
+        return rng.choice(["[>]", "[<]", "[>>]", "[<<]"])
+    elif choice < 0.80:
+        # Whitespace and comment characters, which should be ignored
+        return rng.choice([" ", "\n", "x", "#"])
+    elif depth < 3:
+        return _gen_loop(rng, depth)
+
+    return "+"
+
+def _gen_sequence(rng, count, depth):
+    return "".join([_gen_fragment(rng, depth) for _ in range(count)])
+
+def generate_program(rng, max_fragments=20):
+    """
+    Generate a random brainfuck program
+
+    :param random.Random rng: random number generator to use
+    :param int max_fragments: maximum number of top-level fragments to generate
+    :return: Brainfuck source code
+    :rtype: str
+    """
+
+    # Start a few cells in, so fewer programs fall off the start of the tape
+    prefix = ">" * rng.randint(0, 4)
+    return prefix + _gen_sequence(rng, rng.randint(1, max_fragments), 0)
+
+def _compare(name, expected, actual):
+    exp_tape, exp_pointer, exp_output = expected
+    tape, pointer, output = actual
+    ret = []
+
+    if output != exp_output:
+        ret.append("%s: output %r, expected %r" % (name, output, exp_output))
+
+    if pointer != exp_pointer:
+        ret.append("%s: cell pointer %d, expected %d" % (name, pointer, exp_pointer))
+
+    if tape != exp_tape:
+        diffs = [i for i in range(len(tape)) if tape[i] != exp_tape[i]]
+        ret.append("%s: tape differs at cells %s" % (name, diffs))
+
+    return ret
+
+def _ignore(event):
+    pass
+
+def _make_hooks(program, parse_kwargs):
+    # Callbacks do nothing, but make the hooked loop take every path it has
+    # for tracing and for writes to a watched cell
+    hooks = bfi.debug.Hooks(program, **parse_kwargs)
+    hooks.set_trace(_ignore)
+    hooks.add_watchpoint(0, _ignore)
+    return hooks
+
+def _run_engine(opcodes, input_data, tape_size, exec_kwargs):
+    tape = bfi.Tape(tape_size)
+    iter_kwargs = exec_kwargs.get("iter_output")
+    if iter_kwargs is not None:
+        output = "".join(bfi.iter_output(opcodes, input_data, tape=tape,
+                                         **iter_kwargs))
+    else:
+        output = bfi.execute(opcodes, input_data, buffer_output=True,
+                             tape=tape, **exec_kwargs)
+
+    return tape.cells, tape.pointer, output
+
+def check_program(program, input_data=None, tape_size=30000, max_steps=10000,
+                  configs=CONFIGS):
+    """
+    Run a brainfuck program with the reference interpreter, and with each engine
+    configuration, and compare the results
+
+    :param str program: Brainfuck source code
+    :param str input_data: input data
+    :param int tape_size: Brainfuck program tape size
+    :param int max_steps: maximum number of instructions the reference \
+        interpreter may execute before the program is considered non-terminating
+    :param list configs: engine configurations to check, see :data:`CONFIGS`
+    :return: list of descriptions of any differences found, or None if the \
+        program can't be checked (it doesn't terminate, or leaves the tape)
+    :rtype: [str]
+    """
+
+    try:
+        expected = reference.run(program, input_data, tape_size, max_steps)
+    except (IndexError, bfi.BrainfuckLimitError):
+        return None
+
+    mismatches = []
+
+    for name, parse_kwargs, exec_kwargs in configs:
+        try:
+            opcodes = bfi.parse(program, **parse_kwargs)
+            if exec_kwargs.get("hooks") is True:
+                exec_kwargs = dict(exec_kwargs,
+                                   hooks=_make_hooks(program, parse_kwargs))
+
+            # Run with a step limit first, in case a miscompiled program never
+            # terminates. An opcode never takes more than two steps per
+            # brainfuck instruction (loops re-check their condition on entry).
+            # Execution modes selected by extra arguments, like tiered
+            # execution, can't be combined with a step limit; these rely on
+            # the plain configuration for the same IR having terminated.
+            if not exec_kwargs:
+                kwargs = {"max_steps": (2 * max_steps) + 1}
+                actual = _run_engine(opcodes, input_data, tape_size, kwargs)
+                mismatches.extend(_compare(name + " (counted)", expected, actual))
+
+            # Now we know it terminates, run again without the step limit to
+            # exercise the fast path
+            actual = _run_engine(opcodes, input_data, tape_size, exec_kwargs)
+            mismatches.extend(_compare(name, expected, actual))
+        except Exception as e:
+            mismatches.append("%s: raised %s: %s" % (name, type(e).__name__, e))
+
+    return mismatches
+
+def _balanced(program):
+    depth = 0
+    for c in program:
+        if c == "[":
+            depth += 1
+        elif c == "]":
+            depth -= 1
+            if depth < 0:
+                return False
+
+    return depth == 0
+
+def minimize(program, is_failing):
+    """
+    Shrink a failing brainfuck program, by repeatedly removing chunks of
+    characters and unwrapping loops for as long as the program keeps failing
+
+    :param str program: Brainfuck source code
+    :param callable is_failing: called with a candidate program, should return \
+        True if the candidate still exhibits the failure
+    :return: minimized brainfuck source code
+    :rtype: str
+    """
+
+    chunk = max(1, len(program) // 2)
+    while chunk >= 1:
+        i = 0
+        reduced = False
+        while i < len(program):
+            candidate = program[:i] + program[i + chunk:]
+            if _balanced(candidate) and is_failing(candidate):
+                program = candidate
+                reduced = True
+            else:
+                i += chunk
+
+        if not reduced:
+            chunk //= 2
+
+    # Try replacing each loop with its body
+    i = 0
+    while i < len(program):
+        if program[i] == "[":
+            depth = 0
+            for j in range(i, len(program)):
+                if program[j] == "[":
+                    depth += 1
+                elif program[j] == "]":
+                    depth -= 1
+                    if depth == 0:
+                        break
+
+            candidate = program[:i] + program[i + 1:j] + program[j + 1:]
+            if is_failing(candidate):
+                program = candidate
+                continue
+
+        i += 1
+
+    return program
+
+def fuzz(iterations=1000, seed=None, configs=CONFIGS, max_steps=10000,
+         minimize_failures=True):
+    """
+    Generate random brainfuck programs and check each one with
+    :func:`check_program`
+
+    :param int iterations: number of programs to generate
+    :param seed: seed for the random number generator
+    :param list configs: engine configurations to check, see :data:`CONFIGS`
+    :param int max_steps: maximum number of instructions the reference \
+        interpreter may execute for each program
+    :param bool minimize_failures: if True, minimize failing programs before \
+        reporting them
+    :return: all failures found
+    :rtype: [bfi.fuzz.FuzzFailure]
+    """
+
+    rng = random.Random(seed)
+    failures = []
+
+    for _ in range(iterations):
+        program = generate_program(rng)
+        input_data = "".join([chr(rng.randint(1, 255))
+                              for _ in range(rng.randint(0, 4))])
+        tape_size = rng.choice(TAPE_SIZES)
+
+        def run(p):
+            return check_program(p, input_data, tape_size, max_steps, configs)
+
+        mismatches = run(program)
+        if not mismatches:
+            continue
+
+        if minimize_failures:
+            program = minimize(program, lambda p: bool(run(p)))
+            mismatches = run(program)
+
+        failures.append(FuzzFailure(program, input_data, tape_size, mismatches))
+
+    return failures
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bfi.fuzz",
+        description="Differential fuzzer for the bfi optimizer")
+    parser.add_argument("-n", "--iterations", type=int, default=1000,
+        help="Number of programs to generate (default: %(default)s)")
+    parser.add_argument("-s", "--seed", type=int, default=None,
+        help="Random seed")
+    parser.add_argument("--max-steps", type=int, default=10000,
+        help="Maximum instructions to execute per program (default: %(default)s)")
+    parser.add_argument("--no-minimize", action="store_true",
+        help="Report failing programs without minimizing them")
+    args = parser.parse_args(argv)
+
+    failures = fuzz(args.iterations, args.seed, max_steps=args.max_steps,
+                    minimize_failures=not args.no_minimize)
+
+    for failure in failures:
+        print(failure)
+        print("")
+
+    print("%d programs, %d failures" % (args.iterations, len(failures)))
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""
+Load test for the server in :mod:`bfi.server`.
+
+Sends jobs to a server over a Unix socket from several concurrent clients,
+each with its own connection and one job in flight at a time, and reports
+requests per second and latency percentiles. If no socket path is given, a
+server is started in a subprocess for the duration of the test.
+
+Run from the command line with ``python -m bfi.loadtest``.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+
+from bfi.server import program_hash
+
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "examples")
+
+def _client(path, jobs, latencies, errors):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(path)
+    infile = sock.makefile("r")
+    outfile = sock.makefile("w")
+
+    try:
+        for job in jobs:
+            start = time.time()
+            outfile.write(json.dumps(job) + "\n")
+            outfile.flush()
+
+            while True:
+                line = infile.readline()
+                if not line:
+                    raise IOError("server closed connection")
+
+                resp = json.loads(line)
+                if "status" in resp:
+                    break
+
+            latencies.append(time.time() - start)
+            if resp["status"] != "ok":
+                errors.append(resp)
+    finally:
+        sock.close()
+
+def _percentile(values, pct):
+    values = sorted(values)
+    index = int(round((pct / 100.0) * (len(values) - 1)))
+    return values[index]
+
+def _wait_for_socket(path, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if os.path.exists(path):
+            return
+
+        time.sleep(0.01)
+
+    raise IOError("server did not create socket %s" % path)
+
+def run(path, program, requests=1000, concurrency=4, by_hash=False,
+        input_data=""):
+    """
+    Send jobs to a server, and measure throughput and latency
+
+    :param str path: path of the server's Unix socket
+    :param str program: Brainfuck source code to run for each job
+    :param int requests: total number of jobs to send
+    :param int concurrency: number of concurrent clients
+    :param bool by_hash: if True, send the program source only once, and \
+        identify the program by hash for all other jobs
+    :param str input_data: input data for each job
+    :return: dict of results; 'requests', 'errors', 'elapsed', \
+        'requests_per_sec', 'p50' and 'p99' (latencies in seconds)
+    :rtype: dict
+    """
+
+    jobs = []
+    for i in range(requests):
+        job = {"id": i, "input": input_data}
+        if by_hash and (i >= concurrency):
+            job["hash"] = program_hash(program)
+        else:
+            job["program"] = program
+
+        jobs.append(job)
+
+    latencies = []
+    errors = []
+    threads = []
+
+    start = time.time()
+
+    for i in range(concurrency):
+        t = threading.Thread(target=_client,
+                             args=(path, jobs[i::concurrency], latencies, errors))
+        t.start()
+        threads.append(t)
+
+    for t in threads:
+        t.join()
+
+    elapsed = time.time() - start
+
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "elapsed": elapsed,
+        "requests_per_sec": len(latencies) / elapsed,
+        "p50": _percentile(latencies, 50),
+        "p99": _percentile(latencies, 99),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bfi.loadtest",
+        description="Load test for 'bfi serve'")
+    parser.add_argument("--socket", default=None,
+        help="Unix socket of a running server. If not set, a server is started")
+    parser.add_argument("--workers", type=int, default=4,
+        help="Number of worker threads, if starting a server (default: %(default)s)")
+    parser.add_argument("-n", "--requests", type=int, default=1000,
+        help="Total number of jobs to send (default: %(default)s)")
+    parser.add_argument("-c", "--concurrency", type=int, default=4,
+        help="Number of concurrent clients (default: %(default)s)")
+    parser.add_argument("-p", "--program", default=os.path.join(EXAMPLES_DIR, "hello_world.b"),
+        help="Brainfuck program to run (default: hello_world.b)")
+    parser.add_argument("-i", "--input", default="",
+        help="Input data for each job")
+    parser.add_argument("--by-hash", action="store_true",
+        help="Identify the program by hash instead of sending the source every time")
+    args = parser.parse_args(argv)
+
+    with open(args.program, "r") as fh:
+        program = fh.read()
+
+    proc = None
+    tmpdir = None
+    path = args.socket
+
+    if path is None:
+        tmpdir = tempfile.mkdtemp()
+        path = os.path.join(tmpdir, "bfi.sock")
+        proc = subprocess.Popen([sys.executable, "-m", "bfi", "serve",
+                                 "--socket", path, "--workers", str(args.workers)])
+        _wait_for_socket(path)
+
+    try:
+        results = run(path, program, args.requests, args.concurrency,
+                      args.by_hash, args.input)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    print("requests:      %d (%d errors)" % (results["requests"], results["errors"]))
+    print("elapsed:       %.3f secs" % results["elapsed"])
+    print("requests/sec:  %.1f" % results["requests_per_sec"])
+    print("p50 latency:   %.3f ms" % (results["p50"] * 1000.0))
+    print("p99 latency:   %.3f ms" % (results["p99"] * 1000.0))
+    return 1 if results["errors"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""
+Deliberately naive reference Brainfuck interpreter.
+
+This executes brainfuck source one character at a time, with no intermediate
+form and no optimizations of any kind, so that it is easy to convince yourself
+that it is correct. It exists only to check the output of the optimizing
+interpreter in :mod:`bfi` (see :mod:`bfi.fuzz`), and is far too slow for
+anything else.
+
+I/O behaviour matches :func:`bfi.execute`: when input is exhausted, or a zero
+byte is read, the current cell is left unchanged.
+"""
+
+from bfi import BrainfuckSyntaxError, BrainfuckLimitError
+
+
+def _match_brackets(program):
+    jumps = {}
+    stack = []
+
+    for i, c in enumerate(program):
+        if c == "[":
+            stack.append(i)
+        elif c == "]":
+            if len(stack) == 0:
+                raise BrainfuckSyntaxError("Error: unmatched ']' symbol")
+
+            left = stack.pop()
+            jumps[left] = i
+            jumps[i] = left
+
+    if len(stack) != 0:
+        raise BrainfuckSyntaxError("Error: unmatched '[' symbol")
+
+    return jumps
+
+def run(program, input_data=None, tape_size=30000, max_steps=None):
+    """
+    Run a brainfuck program
+
+    :param str program: Brainfuck source code
+    :param str input_data: input data
+    :param int tape_size: Brainfuck program tape size
+    :param int max_steps: if not None, raise BrainfuckLimitError when the program \
+        tries to execute more than this many brainfuck instructions
+    :raises IndexError: if the cell pointer moves outside of the tape
+    :return: tuple of (tape, cell pointer, output); the final contents of the \
+        tape as a bytearray, the final cell pointer value, and all output \
+        as a string
+    :rtype: (bytearray, int, str)
+    """
+
+    jumps = _match_brackets(program)
+    tape = bytearray(tape_size)
+    stdin = list(reversed(input_data or ""))
+    output = []
+    pc = 0
+    pi = 0
+    steps = 0
+
+    while pc < len(program):
+        c = program[pc]
+
+        if c in "+-<>[],.":
+            if steps == max_steps:
+                raise BrainfuckLimitError("Error: step limit of %d instructions "
+                    "exceeded" % max_steps)
+
+            steps += 1
+
+        if c == "+":
+            tape[pi] = (tape[pi] + 1) % 256
+        elif c == "-":
+            tape[pi] = (tape[pi] - 1) % 256
+        elif c == ">":
+            pi += 1
+            if pi >= tape_size:
+                raise IndexError("cell pointer moved past end of tape")
+        elif c == "<":
+            pi -= 1
+            if pi < 0:
+                raise IndexError("cell pointer moved past start of tape")
+        elif c == "[":
+            if tape[pi] == 0:
+                pc = jumps[pc]
+        elif c == "]":
+            if tape[pi] != 0:
+                pc = jumps[pc]
+        elif c == ",":
+            if len(stdin) > 0:
+                ch = ord(stdin.pop())
+                if ch > 0:
+                    tape[pi] = ch
+        elif c == ".":
+            output.append(chr(tape[pi]))
+
+        pc += 1
+
+    return tape, pi, "".join(output)
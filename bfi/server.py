@@ -0,0 +1,418 @@
+"""
+Long-lived server for running many brainfuck programs without paying for
+python start-up, imports and parsing on every run.
+
+Start with ``python -m bfi serve``. Jobs are read as newline-delimited JSON
+objects, from a Unix socket if ``--socket PATH`` is given, otherwise from
+stdin (with responses written to stdout). Each job looks like this (only one
+of "program" or "hash" is required):
+
+::
+
+    {"id": 1, "program": "++++[>++++<-]>.", "input": "", "tape_size": 30000,
+     "opt_level": 2, "max_steps": 1000000, "time_limit": 10.0, "stats": true}
+
+Parsed programs are kept in a cache shared by all workers, keyed by the SHA-256
+hash of the source code. Once a program has been sent, later jobs can send
+``"hash"`` instead of ``"program"`` to avoid sending the source again. If a job
+sends both, the hash must match the program.
+
+The server has its own step limit, time limit and maximum tape size (see
+``bfi serve -h``). The server's limits are used for jobs that don't set
+"max_steps" or "time_limit", and jobs can only ask for lower limits, not higher
+ones, so that no job can hold a worker forever.
+
+Jobs are run concurrently by a pool of worker threads, and responses for each
+job are written as they happen, so responses for different jobs may be
+interleaved. Output is sent in chunks, at each newline or every
+:data:`OUTPUT_CHUNK_SIZE` bytes:
+
+::
+
+    {"id": 1, "output": "Hello World!\\n"}
+
+followed by one final response with the job's status, which is one of "ok",
+"limit" (step limit or time limit exceeded) or "error":
+
+::
+
+    {"id": 1, "status": "ok", "hash": "9f86d0...", "cached": false,
+     "time": 0.0012, "stats": {"ops": 319, "max_pointer": 6}}
+
+Responses with status "error" (or "limit") also have an "error" field
+describing the problem. "stats" is only included if the job set "stats" to
+true, since counting opcodes makes execution slower.
+
+Note that worker threads share one python interpreter, so CPU-bound jobs
+don't run in parallel; the pool mostly helps by letting short jobs finish
+while long ones are still running. To use several CPU cores, run one server
+per core.
+"""
+
+import os
+import sys
+import json
+import math
+import stat
+import time
+import socket
+import hashlib
+import argparse
+import threading
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+import bfi
+
+
+# Output is sent to the client at each newline, or once this many bytes of
+# output have accumulated, whichever happens first
+OUTPUT_CHUNK_SIZE = 4096
+
+def program_hash(program):
+    """
+    Get the hash used to identify a program in the server's cache
+
+    :param str program: Brainfuck source code
+    :return: SHA-256 hash of the source code, as a hex string
+    :rtype: str
+    """
+
+    return hashlib.sha256(program.encode("utf-8")).hexdigest()
+
+class ProgramCache(object):
+    """
+    Thread-safe cache of parsed programs, keyed by program hash and
+    optimization level. The least recently used program is discarded when the
+    cache is full.
+
+    :param int max_size: maximum number of programs to keep
+    """
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self._sources = collections.OrderedDict()
+        self._opcodes = {}
+        self._lock = threading.Lock()
+
+    def _touch(self, phash):
+        # Re-insert to mark as most recently used (OrderedDict.move_to_end is
+        # python 3 only)
+        self._sources[phash] = self._sources.pop(phash)
+
+    def get(self, phash, program=None, opt_level=2):
+        """
+        Get parsed opcodes for a program, parsing and caching it if required
+
+        :param str phash: program hash, or None to calculate it from 'program'
+        :param str program: Brainfuck source code, or None if the program \
+            should already be in the cache
+        :param int opt_level: optimization level to pass to :func:`bfi.parse`
+        :raises KeyError: if 'program' is None and the hash is not in the cache
+        :raises ValueError: if both 'phash' and 'program' are given, and \
+            'phash' is not the hash of 'program'
+        :return: tuple of (hash, opcodes, cached) where 'cached' is True if no \
+            parsing was needed
+        :rtype: (str, [bfi.Opcode], bool)
+        """
+
+        if program is not None:
+            # Never trust a hash sent along with a program; otherwise one
+            # client could cache any program under another program's hash
+            actual = program_hash(program)
+            if (phash is not None) and (phash != actual):
+                raise ValueError("hash does not match program")
+
+            phash = actual
+
+        with self._lock:
+            if phash in self._sources:
+                self._touch(phash)
+                opcodes = self._opcodes.get((phash, opt_level))
+                if opcodes is not None:
+                    return phash, opcodes, True
+
+                program = self._sources[phash]
+            elif program is None:
+                raise KeyError(phash)
+
+        # Parse without holding the lock, so other workers aren't held up
+        # by a large program. If two workers parse the same program at the
+        # same time, one result is just thrown away.
+        opcodes = bfi.parse(program, opt_level)
+
+        with self._lock:
+            if phash not in self._sources:
+                self._sources[phash] = program
+                while len(self._sources) > self.max_size:
+                    old, _ = self._sources.popitem(last=False)
+                    for level in (0, 1, 2):
+                        self._opcodes.pop((old, level), None)
+
+            self._opcodes[(phash, opt_level)] = opcodes
+
+        return phash, opcodes, False
+
+    def __len__(self):
+        return len(self._sources)
+
+class _Connection(object):
+    """
+    Sends JSON responses for one client, one line per response
+    """
+
+    def __init__(self, outfile):
+        self._outfile = outfile
+        self._lock = threading.Lock()
+
+    def send(self, msg):
+        line = json.dumps(msg) + "\n"
+        with self._lock:
+            try:
+                self._outfile.write(line)
+                self._outfile.flush()
+            except (IOError, OSError, ValueError):
+                # Client has gone away; nothing else to do with the response
+                pass
+
+class Server(object):
+    """
+    Runs brainfuck jobs on a pool of worker threads
+
+    :param int workers: number of worker threads
+    :param int cache_size: maximum number of programs to keep in the cache
+    :param int max_steps: step limit for jobs that don't set one, and the \
+        highest step limit a job may set. None for no limit.
+    :param float time_limit: time limit in seconds for jobs that don't set \
+        one, and the highest time limit a job may set. None for no limit.
+    :param int max_tape_size: largest tape size a job may ask for
+    """
+
+    def __init__(self, workers=4, cache_size=256, max_steps=None,
+                 time_limit=60.0, max_tape_size=1000000):
+        self.cache = ProgramCache(cache_size)
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.max_steps = max_steps
+        self.time_limit = time_limit
+        self.max_tape_size = max_tape_size
+
+    def _limit(self, job, name, server_limit, integer=False):
+        value = job.get(name)
+        if value is None:
+            return server_limit
+
+        # Negative, fractional or NaN limits would never be reached, so they
+        # would turn the server's limit off instead of lowering it
+        types = (int,) if integer else (int, float)
+        if (isinstance(value, bool) or (not isinstance(value, types))
+                or math.isinf(value) or math.isnan(value) or (value < 0)):
+            raise ValueError("'%s' must be a non-negative %s" % (name,
+                             "integer" if integer else "number"))
+
+        if server_limit is None:
+            return value
+
+        return min(value, server_limit)
+
+    def run_job(self, job, send):
+        """
+        Run one job, sending all responses for it with 'send'
+
+        :param dict job: job description, as described in :mod:`bfi.server`
+        :param callable send: called with each response dict
+        """
+
+        job_id = job.get("id")
+        start = time.time()
+        resp = {"id": job_id}
+        stats = {} if job.get("stats") else None
+        out = []
+
+        def write_byte(c):
+            out.append(chr(c))
+            if (c == 10) or (len(out) >= OUTPUT_CHUNK_SIZE):
+                send({"id": job_id, "output": "".join(out)})
+                del out[:]
+
+        try:
+            try:
+                phash, opcodes, cached = self.cache.get(job.get("hash"),
+                    job.get("program"), job.get("opt_level", 2))
+            except KeyError:
+                raise ValueError("unknown program hash")
+
+            resp["hash"] = phash
+            resp["cached"] = cached
+
+            # Input must never be None, or execute() would read from the
+            # server's own stdin
+            input_data = job.get("input")
+            if input_data is None:
+                input_data = ""
+            elif not bfi._isstr(input_data):
+                raise ValueError("'input' must be a string")
+
+            tape_size = job.get("tape_size", min(30000, self.max_tape_size))
+            if (isinstance(tape_size, bool) or (not isinstance(tape_size, int))
+                    or (tape_size < 1) or (tape_size > self.max_tape_size)):
+                raise ValueError("'tape_size' must be an integer from 1 to %d"
+                                 % self.max_tape_size)
+
+            bfi.execute(opcodes, input_data, tape_size=tape_size,
+                        write_byte=write_byte, stats=stats,
+                        max_steps=self._limit(job, "max_steps", self.max_steps,
+                                              integer=True),
+                        time_limit=self._limit(job, "time_limit", self.time_limit))
+
+        except bfi.BrainfuckLimitError as e:
+            resp["status"] = "limit"
+            resp["error"] = str(e)
+        except IndexError:
+            resp["status"] = "error"
+            resp["error"] = "cell pointer moved outside of tape"
+        except Exception as e:
+            resp["status"] = "error"
+            resp["error"] = str(e)
+        else:
+            resp["status"] = "ok"
+
+        if out:
+            send({"id": job_id, "output": "".join(out)})
+
+        resp["time"] = time.time() - start
+        if stats is not None:
+            resp["stats"] = stats
+
+        send(resp)
+
+    def submit(self, line, send):
+        """
+        Decode one line of JSON and queue it to be run
+
+        :param str line: JSON job description
+        :param callable send: called with each response dict
+        :return: future for the queued job, or None if the line was invalid
+        """
+
+        try:
+            job = json.loads(line)
+            if not isinstance(job, dict):
+                raise ValueError("job must be a JSON object")
+
+            if ("program" not in job) and ("hash" not in job):
+                raise ValueError("job must have a 'program' or 'hash' field")
+        except ValueError as e:
+            send({"id": None, "status": "error", "error": "invalid job: %s" % e})
+            return None
+
+        return self.pool.submit(self.run_job, job, send)
+
+    def serve_stream(self, infile, outfile):
+        """
+        Read jobs from 'infile' until EOF, writing responses to 'outfile'.
+        Returns once all jobs have finished.
+
+        :param infile: file object to read jobs from
+        :param outfile: file object to write responses to
+        """
+
+        conn = _Connection(outfile)
+        pending = []
+
+        for line in infile:
+            if not line.strip():
+                continue
+
+            future = self.submit(line, conn.send)
+            if future is not None:
+                pending.append(future)
+
+            pending = [f for f in pending if not f.done()]
+
+        for future in pending:
+            future.result()
+
+    def _serve_client(self, sock):
+        try:
+            infile = sock.makefile("r")
+            outfile = sock.makefile("w")
+            self.serve_stream(infile, outfile)
+        finally:
+            sock.close()
+
+    def serve_unix(self, path):
+        """
+        Accept connections on a Unix socket forever, serving each one on a
+        separate thread
+
+        :param str path: path to create the socket at
+        """
+
+        if os.path.exists(path):
+            # Only remove a stale socket, never some other file that happens
+            # to be at this path
+            if not stat.S_ISSOCK(os.stat(path).st_mode):
+                raise IOError("%s already exists, and is not a socket" % path)
+
+            os.unlink(path)
+
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(path)
+        listener.listen(64)
+
+        try:
+            while True:
+                sock, _ = listener.accept()
+                t = threading.Thread(target=self._serve_client, args=(sock,))
+                t.daemon = True
+                t.start()
+        finally:
+            listener.close()
+            os.unlink(path)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="bfi serve",
+        description="Run brainfuck jobs received as newline-delimited JSON")
+    parser.add_argument("--socket", default=None,
+        help="Path of Unix socket to listen on. If not set, jobs are read from "
+             "stdin and responses written to stdout")
+    parser.add_argument("--workers", type=int, default=4,
+        help="Number of worker threads (default: %(default)s)")
+    parser.add_argument("--cache-size", type=int, default=256,
+        help="Maximum number of parsed programs to keep (default: %(default)s)")
+    parser.add_argument("--max-steps", type=int, default=None,
+        help="Step limit for jobs that don't set one, and the highest step "
+             "limit a job may set (default: no limit)")
+    parser.add_argument("--time-limit", type=float, default=60.0,
+        help="Time limit in seconds for jobs that don't set one, and the "
+             "highest time limit a job may set. 0 for no limit "
+             "(default: %(default)s)")
+    parser.add_argument("--max-tape-size", type=int, default=1000000,
+        help="Largest tape size a job may ask for (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    time_limit = args.time_limit if args.time_limit > 0 else None
+    server = Server(args.workers, args.cache_size, args.max_steps, time_limit,
+                    args.max_tape_size)
+    ret = 0
+
+    try:
+        if args.socket is None:
+            server.serve_stream(sys.stdin, sys.stdout)
+        else:
+            server.serve_unix(args.socket)
+    except KeyboardInterrupt:
+        pass
+    except (IOError, OSError) as e:
+        sys.stderr.write("Error: %s\n" % e)
+        ret = 1
+    finally:
+        server.shutdown()
+
+    return ret
+
+if __name__ == "__main__":
+    sys.exit(main())
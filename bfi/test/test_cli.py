@@ -0,0 +1,52 @@
+import io
+import os
+import unittest
+import contextlib
+
+from bfi.test.utils import SAMPLES_DIR
+from bfi.__main__ import main
+
+class TestCommandLine(unittest.TestCase):
+    def run_main(self, *args):
+        out = io.StringIO()
+        err = io.StringIO()
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+            ret = main(list(args))
+
+        return ret, out.getvalue(), err.getvalue()
+
+    def test_run_file(self):
+        for level in ["0", "1", "2"]:
+            ret, out, err = self.run_main("-O", level,
+                os.path.join(SAMPLES_DIR, "hello_world.b"))
+            self.assertEqual(ret, 0)
+            self.assertEqual(out, "Hello World!\n")
+
+    def test_examples(self):
+        ret, out, err = self.run_main("-e")
+        self.assertEqual(ret, 0)
+        names = [os.path.basename(p) for p in out.splitlines()]
+        self.assertIn("hello_world.b", names)
+        self.assertIn("LostKingdom.b", names)
+
+    def test_dump_ir(self):
+        ret, out, err = self.run_main("--dump-ir",
+            os.path.join(SAMPLES_DIR, "hello_world.b"))
+        self.assertEqual(ret, 0)
+        self.assertEqual(out.splitlines()[0], "add 0 8")
+
+    def test_stats_and_time(self):
+        ret, out, err = self.run_main("--stats", "--time", "--buffered",
+            os.path.join(SAMPLES_DIR, "hello_world.b"))
+        self.assertEqual(ret, 0)
+        self.assertEqual(out, "Hello World!\n")
+        self.assertIn("ops executed:", err)
+        self.assertIn("tape high-water mark:", err)
+        self.assertIn("parse time:", err)
+        self.assertIn("execute time:", err)
+
+    def test_max_steps(self):
+        ret, out, err = self.run_main("--max-steps", "10",
+            os.path.join(SAMPLES_DIR, "hello_world.b"))
+        self.assertEqual(ret, 1)
+        self.assertIn("step limit", err)
@@ -0,0 +1,123 @@
+import unittest
+
+import bfi
+from bfi.debug import Hooks, measure_overhead
+
+PROGRAM = """\
+++++ set cell 0 to 4
+[
+  >+++ add 3 to cell 1
+  <-
+]
+>.
+"""
+
+class StopProgram(Exception):
+    pass
+
+class TestSourcePositions(unittest.TestCase):
+    def test_positions(self):
+        program = "++ >>\n+ [- >+<] x\n <<.>>>"
+        for level in [0, 1, 2]:
+            positions = []
+            opcodes = bfi.parse(program, level, positions=positions)
+            self.assertEqual(len(positions), len(opcodes))
+
+            # Spans should be in order, and not overlap
+            for i in range(1, len(positions)):
+                self.assertLessEqual(positions[i - 1][1], positions[i][0])
+
+        positions = []
+        opcodes = bfi.parse(program, 2, positions=positions)
+        spans = [program[start:end] for start, end in positions]
+        self.assertEqual(spans, ["++", ">>\n+", "[- >+<]", "<<.", ">>>"])
+
+class TestHooks(unittest.TestCase):
+    def test_breakpoint(self):
+        events = []
+        values = []
+
+        def callback(event):
+            events.append(event)
+            values.append(event.tape[0])
+
+        hooks = Hooks(PROGRAM)
+        index = hooks.add_breakpoint(4, 3, callback)
+        self.assertEqual(hooks.location(index), (4, 3))
+
+        ret = hooks.run(buffer_output=True)
+        self.assertEqual(ret, "\x0c")
+        self.assertEqual(values, [4, 3, 2, 1])
+        self.assertEqual(events[0].kind, "breakpoint")
+        self.assertEqual((events[0].line, events[0].column), (4, 3))
+
+        hooks.remove_breakpoint(4, 3)
+        del events[:]
+        hooks.run(buffer_output=True)
+        self.assertEqual(events, [])
+
+    def test_breakpoint_in_comment(self):
+        # Breakpoint in a comment goes on the next opcode
+        hooks = Hooks(PROGRAM)
+        index = hooks.add_breakpoint(3, 8, lambda e: None)
+        self.assertEqual(hooks.location(index), (4, 3))
+
+        self.assertRaises(ValueError, hooks.add_breakpoint, 7, 1, None)
+        self.assertRaises(ValueError, hooks.add_breakpoint, 0, 1, None)
+
+    def test_watchpoint(self):
+        events = []
+        hooks = Hooks(PROGRAM)
+        hooks.add_watchpoint(1, events.append)
+        hooks.run(buffer_output=True)
+
+        self.assertEqual([(e.old, e.new) for e in events],
+                         [(0, 3), (3, 6), (6, 9), (9, 12)])
+        self.assertEqual(events[0].kind, "watchpoint")
+        self.assertEqual(events[0].cell, 1)
+
+    def test_watchpoint_copy_loop(self):
+        events = []
+        hooks = Hooks("+++[->++<]")
+        hooks.add_watchpoint(0, events.append)
+        hooks.add_watchpoint(1, events.append)
+        hooks.run(buffer_output=True)
+
+        self.assertEqual([(e.cell, e.old, e.new) for e in events],
+                         [(0, 0, 3), (1, 0, 6), (0, 3, 0)])
+
+    def test_trace(self):
+        events = []
+        hooks = Hooks(PROGRAM)
+        hooks.set_trace(events.append)
+        hooks.run(buffer_output=True)
+
+        stats = {}
+        bfi.execute(hooks.opcodes, buffer_output=True, stats=stats)
+        self.assertEqual(len(events), stats["ops"])
+
+    def test_stop_from_callback(self):
+        def stop(event):
+            if event.new == 9:
+                raise StopProgram()
+
+        hooks = Hooks(PROGRAM)
+        hooks.add_watchpoint(1, stop)
+        tape = bfi.Tape(8)
+        self.assertRaises(StopProgram, hooks.run, tape=tape)
+        self.assertEqual(tape.cells[0], 2)
+
+    def test_invalid_arguments(self):
+        hooks = Hooks(PROGRAM)
+        self.assertRaises(ValueError, hooks.run, tiered=True)
+        self.assertRaises(ValueError, hooks.run, max_steps=10)
+        self.assertRaises(ValueError, hooks.run, stats={})
+
+        hooks.add_watchpoint(10, None)
+        self.assertRaises(ValueError, hooks.run, tape_size=5)
+
+    def test_measure_overhead(self):
+        results = measure_overhead(PROGRAM, repeat=1)
+        self.assertEqual([r[0] for r in results], ["plain execute()",
+            "hooks, none set", "breakpoint", "watchpoint", "trace"])
+        self.assertEqual(results[0][2], 1.0)
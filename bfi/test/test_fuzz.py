@@ -0,0 +1,82 @@
+import random
+import unittest
+
+import bfi
+import bfi.debug
+from bfi import reference
+from bfi.compiler import compile_loop
+from bfi.fuzz import fuzz, check_program, generate_program, minimize
+
+class TestDifferentialFuzzer(unittest.TestCase):
+    def test_fuzz_no_failures(self):
+        failures = fuzz(iterations=300, seed=1234)
+        self.assertEqual(failures, [], "\n\n".join([str(f) for f in failures]))
+
+    def test_generate_program_is_valid(self):
+        rng = random.Random(99)
+        for _ in range(100):
+            # Should never raise BrainfuckSyntaxError
+            bfi.parse(generate_program(rng))
+
+    def test_reference_interpreter(self):
+        tape, pointer, output = reference.run("++>+++[<+>-]<.>", tape_size=4)
+        self.assertEqual(output, "\x05")
+        self.assertEqual(pointer, 1)
+        self.assertEqual(tape, bytearray([5, 0, 0, 0]))
+
+        self.assertRaises(IndexError, reference.run, "<")
+        self.assertRaises(IndexError, reference.run, ">>", tape_size=2)
+        self.assertRaises(bfi.BrainfuckLimitError, reference.run, "+[]",
+                          max_steps=100)
+
+    def test_unchecked_programs(self):
+        # Programs that leave the tape or don't terminate can't be compared
+        self.assertEqual(check_program("<"), None)
+        self.assertEqual(check_program("+[]", max_steps=100), None)
+
+    def test_minimize(self):
+        def is_failing(program):
+            return "[>]" in program
+
+        self.assertEqual(minimize("++>[-]>>+[>]<<.,", is_failing), "[>]")
+
+class TestOptimizerRegressions(unittest.TestCase):
+    def test_scanr_bounded_by_tape(self):
+        # Scan further right than the number of opcodes in the program
+        self.assertEqual(check_program(">>-[>]<", tape_size=8), [])
+        self.assertEqual(check_program("+>+>+>+>+>+>+>+>+<<<<<<<<[>]+"), [])
+
+    def test_scan_off_tape(self):
+        self.assertRaises(IndexError, bfi.interpret, "+[>]", tape_size=1)
+        self.assertRaises(IndexError, bfi.interpret, "+[<]", tape_size=1)
+
+        # Scanning left from past the end of the tape must not find a zero
+        # cell inside the tape. The fuzzer can't catch this, since it skips
+        # programs that leave the tape.
+        program = ">>>>>>>>>>[<]+."
+        for kwargs in [{}, {"stats": {}}, {"tiered": True, "tier_threshold": 1},
+                       {"memoize": True}]:
+            self.assertRaises(IndexError, bfi.interpret, program, tape_size=4,
+                              buffer_output=True, **kwargs)
+
+        self.assertRaises(IndexError, list, bfi.iter_output(program, tape_size=4))
+        hooks = bfi.debug.Hooks(program)
+        self.assertRaises(IndexError, bfi.execute, hooks.opcodes, tape_size=4,
+                          buffer_output=True, hooks=hooks)
+        loop = compile_loop(bfi.parse("+[>>>>>>>>>>[<]]"), 1)
+        self.assertRaises(IndexError, loop, bytearray([1, 0, 0, 0]), 0, None, None)
+
+    def test_trailing_pointer_movement(self):
+        tape = bfi.Tape(8)
+        bfi.execute(bfi.parse("+>>"), tape=tape)
+        self.assertEqual(tape.pointer, 2)
+
+    def test_idioms_at_end_of_program(self):
+        for program, code in [("+[-]", bfi.OPCODE_CLEAR),
+                              ("+[>]", bfi.OPCODE_SCANR),
+                              (">+[<]", bfi.OPCODE_SCANL),
+                              ("+[->+<]", bfi.OPCODE_COPY)]:
+            self.assertEqual(bfi.parse(program)[-1].code, code)
+
+    def test_unterminated_copyloop(self):
+        self.assertRaises(bfi.BrainfuckSyntaxError, bfi.parse, "[->>+<<")
@@ -1,7 +1,8 @@
+import time
 import unittest
 
 from bfi.test.utils import SampleCode, verify_exec_time, verify_tape_size
-from bfi import interpret
+from bfi import interpret, BrainfuckLimitError
 
 class TestInterpretArguments(unittest.TestCase):
     def test_stdout_kwarg(self):
@@ -67,3 +68,34 @@ class TestInterpretArguments(unittest.TestCase):
         sizes = [1, 3, 5, 7, 10, 15, 20, 100, 200, 30000, 300000]
         for size in sizes:
             verify_tape_size(size)
+
+    def test_opt_level_kwarg(self):
+        with SampleCode("hello_world") as program:
+            for level in [0, 1, 2]:
+                ret = interpret(program, buffer_output=True, opt_level=level)
+                self.assertEqual(ret.strip(), "Hello World!")
+
+        self.assertRaises(ValueError, interpret, "+", opt_level=3)
+
+    def test_stats_kwarg(self):
+        stats = {}
+        ret = interpret('++>>+++<<.', buffer_output=True, stats=stats)
+        self.assertEqual(ret, '\x02')
+        self.assertEqual(stats, {'ops': 3, 'max_pointer': 2})
+
+        # Cells written by a copy loop count towards the high-water mark
+        stats = {}
+        interpret('+[->>>+<<<]', stats=stats)
+        self.assertEqual(stats['max_pointer'], 3)
+
+    def test_max_steps_kwarg(self):
+        self.assertRaises(BrainfuckLimitError, interpret, '+[]', max_steps=100)
+
+        # Exactly enough steps should not raise
+        ret = interpret('+.+.', buffer_output=True, max_steps=4)
+        self.assertEqual(ret, '\x01\x02')
+
+    def test_time_limit_kwarg(self):
+        start = time.time()
+        self.assertRaises(BrainfuckLimitError, interpret, '+[]', time_limit=0.1)
+        self.assertLess(time.time() - start, 5.0)
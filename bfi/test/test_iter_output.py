@@ -0,0 +1,84 @@
+import os
+import unittest
+import itertools
+
+import bfi
+from bfi import iter_output, BrainfuckSyntaxError
+from bfi.test.utils import SAMPLES_DIR
+
+
+# Prints "A\n" forever, incrementing cell 3 once for each line
+FOREVER = "++++++++[>++++++++<-]>+>++++++++++[<.>.>+<]"
+
+class TestIterOutput(unittest.TestCase):
+    def test_newline_chunks(self):
+        chunks = list(iter_output("++++++++[>++++++++<-]>+.+.>++++++++++.<+.>."))
+        self.assertEqual(chunks, ["AB\n", "C\n"])
+
+    def test_size_chunks(self):
+        program = "++++++++[>++++++++<-]>+" + (".+" * 10)
+        self.assertEqual(list(iter_output(program, chunk_size=4)),
+                         ["ABCD", "EFGH", "IJ"])
+
+        nl = "++++++++++" + (".+" * 3)
+        self.assertEqual(list(iter_output(nl, chunk_size=2, line_buffered=False)),
+                         ["\n\x0b", "\x0c"])
+        self.assertEqual(list(iter_output(nl, chunk_size=2)),
+                         ["\n", "\x0b\x0c"])
+
+        self.assertRaises(ValueError, iter_output, "+", chunk_size=0)
+
+    def test_same_as_execute(self):
+        with open(os.path.join(SAMPLES_DIR, "hello_world.b"), "r") as fh:
+            program = fh.read()
+
+        opcodes = bfi.parse(program)
+        expected = bfi.execute(opcodes, buffer_output=True)
+        self.assertEqual("".join(iter_output(opcodes)), expected)
+        self.assertEqual("".join(iter_output(program, opt_level=0)), expected)
+
+    def test_input(self):
+        self.assertEqual(list(iter_output(",.,.,.,.,.", "ab\ncd")), ["ab\n", "cd"])
+        self.assertEqual(list(iter_output(",+.", read_byte=lambda: 64)), ["A"])
+
+    def test_pauses_between_chunks(self):
+        tape = bfi.Tape(10)
+        gen = iter_output(FOREVER, tape=tape)
+
+        # Nothing runs until output is requested
+        self.assertEqual(tape.cells[1], 0)
+
+        self.assertEqual(next(gen), "A\n")
+        self.assertEqual(tape.cells[3], 0)
+        self.assertEqual(tape.pointer, 2)
+
+        self.assertEqual(list(itertools.islice(gen, 4)), ["A\n"] * 4)
+        self.assertEqual(tape.cells[3], 4)
+
+    def test_close(self):
+        tape = bfi.Tape(10)
+        gen = iter_output(FOREVER, tape=tape)
+        next(gen)
+        next(gen)
+        gen.close()
+
+        self.assertRaises(StopIteration, next, gen)
+        self.assertEqual(tape.cells[3], 1)
+        self.assertEqual(tape.pointer, 2)
+
+        # Execution can continue on the same tape, from where it stopped
+        self.assertEqual(list(iter_output(">+.", tape=tape)), ["\x02"])
+
+    def test_errors(self):
+        # Syntax errors are raised straight away, runtime errors when the
+        # program gets to them
+        self.assertRaises(BrainfuckSyntaxError, iter_output, "[")
+
+        tape = bfi.Tape(10)
+        gen = iter_output("+.>+>++[<]", tape=tape, chunk_size=1)
+        self.assertEqual(next(gen), "\x01")
+        self.assertRaises(IndexError, next, gen)
+
+        # Tape is left as it was when the error happened
+        self.assertEqual(tape.cells[:3], bytearray([1, 1, 2]))
+        self.assertEqual(tape.pointer, 2)
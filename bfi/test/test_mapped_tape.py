@@ -0,0 +1,160 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import contextlib
+import multiprocessing
+
+import bfi
+from bfi import MappedTape
+from bfi.__main__ import main
+
+
+def _fill_cell(tape, cell):
+    # Run in a child process, writing to a tape shared with the parent
+    bfi.execute(bfi.parse(">" * cell + "+" * (cell + 1)), tape=tape)
+
+class TestMappedTape(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "tape.bin")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_anonymous(self):
+        with MappedTape(100) as tape:
+            self.assertEqual(len(tape), 100)
+            ret = bfi.execute(bfi.parse("++++++++[>++++++++<-]>+.>>[-]+[<]>"),
+                              tape=tape, buffer_output=True)
+            self.assertEqual(ret, "A")
+            self.assertEqual(tape.pointer, 3)
+            self.assertEqual(bytes(tape.cells[:4]), b"\x00\x41\x00\x01")
+
+        self.assertRaises(ValueError, MappedTape)
+        self.assertRaises(ValueError, MappedTape, 100, access="copy")
+        self.assertRaises(ValueError, MappedTape, 100, self.path, "append")
+
+    def test_file_persists(self):
+        with MappedTape(64, self.path) as tape:
+            bfi.execute(bfi.parse("+++>++[>+<-]>[<+>-]<<[>>+<<-]"), tape=tape)
+
+        with open(self.path, "rb") as fh:
+            data = fh.read()
+
+        self.assertEqual(len(data), 64)
+        self.assertEqual(data[:4], b"\x00\x02\x03\x00")
+
+        # Start a new run from the saved tape, with size taken from the file
+        with MappedTape(path=self.path) as tape:
+            self.assertEqual(len(tape), 64)
+            ret = bfi.execute(bfi.parse(">>[-<+>]<."), tape=tape, buffer_output=True)
+            self.assertEqual(ret, "\x05")
+
+        # Extended with zeros when a bigger tape is requested
+        with MappedTape(128, self.path) as tape:
+            self.assertEqual(len(tape), 128)
+            self.assertEqual(tape.cells[1], 5)
+            self.assertEqual(tape.cells[127], 0)
+
+    def test_copy_and_read(self):
+        with open(self.path, "wb") as fh:
+            fh.write(b"\x01\x02\x00\x04" + bytes(60))
+
+        with MappedTape(path=self.path, access="copy") as tape:
+            bfi.execute(bfi.parse("[>]++[-<+>]"), tape=tape)
+            self.assertEqual(bytes(tape.cells[:4]), b"\x01\x04\x00\x04")
+
+        with MappedTape(path=self.path, access="read") as tape:
+            ret = bfi.execute(bfi.parse("[>]>."), tape=tape, buffer_output=True)
+            self.assertEqual(ret, "\x04")
+            self.assertRaises(TypeError, bfi.execute, bfi.parse("+"), tape=tape)
+
+        with open(self.path, "rb") as fh:
+            self.assertEqual(fh.read(4), b"\x01\x02\x00\x04")
+
+        self.assertRaises(ValueError, MappedTape, 128, self.path, "read")
+
+    def test_empty_file(self):
+        # Size can't be taken from a missing or empty file, and the file is
+        # left untouched
+        self.assertRaises(ValueError, MappedTape, path=self.path)
+        self.assertFalse(os.path.exists(self.path))
+
+        open(self.path, "wb").close()
+        self.assertRaises(ValueError, MappedTape, path=self.path)
+        self.assertEqual(os.path.getsize(self.path), 0)
+
+        self.assertRaises(ValueError, MappedTape, 0, self.path)
+        self.assertRaises(ValueError, MappedTape, 0)
+
+    def test_execution_modes(self):
+        program = "++++++[>++++++++<-]>[>+>+<<-]>[-]>[[>]+[<]>-]>[>]<<[<]>."
+        opcodes = bfi.parse(program)
+        expected = bfi.interpret(program, buffer_output=True)
+
+        for kwargs in [{}, {"stats": {}}, {"tiered": True, "tier_threshold": 1}]:
+            with MappedTape(1000) as tape:
+                ret = bfi.execute(opcodes, tape=tape, buffer_output=True, **kwargs)
+                self.assertEqual(ret, expected)
+
+    def test_shared_between_processes(self):
+        if not hasattr(os, "fork"):
+            self.skipTest("anonymous tapes are only shared by forked processes")
+
+        ctx = multiprocessing.get_context("fork")
+        with MappedTape(16) as tape:
+            procs = [ctx.Process(target=_fill_cell, args=(tape, i)) for i in range(4)]
+            for p in procs:
+                p.start()
+
+            for p in procs:
+                p.join()
+
+            self.assertEqual(bytes(tape.cells[:5]), b"\x01\x02\x03\x04\x00")
+
+    def test_cli(self):
+        with open(self.path, "wb") as fh:
+            fh.write(b"\x40" + bytes(99))
+
+        program = os.path.join(self.tmpdir, "prog.b")
+        with open(program, "w") as fh:
+            fh.write("+.>+")
+
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            ret = main(["-t", "100", "--tape-file", self.path, program])
+
+        self.assertEqual(ret, 0)
+        self.assertEqual(out.getvalue(), "A")
+
+        with open(self.path, "rb") as fh:
+            self.assertEqual(fh.read(3), b"\x41\x01\x00")
+
+        # Without -t, the tape is the same size as the file, whether it's
+        # smaller or bigger than the default tape size
+        for size in [100, 40000]:
+            with open(self.path, "wb") as fh:
+                fh.write(b"\x00" * (size - 1) + b"\x40")
+
+            # Output the last cell of the file
+            with open(program, "w") as fh:
+                fh.write((">" * (size - 1)) + "+.")
+
+            out = io.StringIO()
+            with contextlib.redirect_stdout(out):
+                ret = main(["--tape-file", self.path, program])
+
+            self.assertEqual(ret, 0)
+            self.assertEqual(out.getvalue(), "A")
+            self.assertEqual(os.path.getsize(self.path), size)
+
+        # A new file needs a size
+        os.remove(self.path)
+        err = io.StringIO()
+        with contextlib.redirect_stderr(err):
+            ret = main(["--tape-file", self.path, program])
+
+        self.assertEqual(ret, 1)
+        self.assertIn("size is required", err.getvalue())
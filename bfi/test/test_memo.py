@@ -0,0 +1,94 @@
+import io
+import os
+import unittest
+import contextlib
+
+import bfi
+from bfi import _loop_window
+from bfi.__main__ import main
+from bfi.test.utils import SAMPLES_DIR, verify_sample_programs, verify_final_tape
+
+
+# Runs the same loop 10 times, starting with the same window contents each
+# time; [-->+<] isn't replaced by the optimizer, and runs 50 iterations
+REPEATED = "++++++++++[>" + ("+" * 100) + "[-->+<]>[-]<<-]"
+
+class TestMemoizedExecution(unittest.TestCase):
+    def test_sample_programs(self):
+        for memo_size in [1, 2, 16, 4096]:
+            verify_sample_programs(self, memoize=True, memo_size=memo_size)
+
+    def test_loop_window(self):
+        def window(program, opt_level=1):
+            return _loop_window(bfi.parse(program, opt_level), 0)
+
+        self.assertEqual(window("[->+>+<<]"), (0, 2))
+        self.assertEqual(window("[<->-]"), (-1, 0))
+        self.assertEqual(window("[->[->+<]<]"), (0, 2))
+        self.assertEqual(window("[-<<[-]>>]", 2), (-2, 0))
+        self.assertEqual(window("[-[->>+<<]]", 2), (0, 2))
+
+        # Unbalanced, I/O and scan loops can't be memoized
+        self.assertFalse(window("[->]"))
+        self.assertFalse(window("[->[>]<]"))
+        self.assertFalse(window("[.-]"))
+        self.assertFalse(window("[,]"))
+        self.assertFalse(window("[->[<]>]", 2))
+
+    def test_stats(self):
+        stats = {}
+        tape = bfi.Tape(8)
+        bfi.execute(bfi.parse(REPEATED), tape=tape, memoize=True, stats=stats)
+        self.assertEqual(tape.cells, bytearray(8))
+        self.assertEqual(stats["memo_hits"], 9)
+        self.assertEqual(stats["memo_misses"], 2)
+        self.assertEqual(stats["memo_evictions"], 0)
+        self.assertEqual(stats["memo_loops"], 2)
+        self.assertEqual(stats["memo_skipped"], 0)
+
+        # Inner loop result is evicted when the outer loop's result is stored
+        stats = {}
+        bfi.execute(bfi.parse(REPEATED), memoize=True, memo_size=1, stats=stats)
+        self.assertEqual(stats["memo_hits"], 9)
+        self.assertEqual(stats["memo_evictions"], 1)
+
+    def test_cost_model(self):
+        # Inner loop only runs one iteration, with a different window each time
+        stats = {}
+        tape = bfi.Tape(8)
+        program = ("+" * 20) + "[>++[-->+<]<-]"
+        bfi.execute(bfi.parse(program), tape=tape, memoize=True, stats=stats)
+        self.assertEqual(tape.cells[2], 20)
+        self.assertEqual(stats["memo_hits"], 0)
+        self.assertEqual(stats["memo_misses"], 9)
+        self.assertEqual(stats["memo_loops"], 1)
+        self.assertEqual(stats["memo_skipped"], 1)
+
+    def test_final_tape_state(self):
+        programs = [
+            REPEATED,
+            "+++[>++[>+<-]<-]>>",
+            "+>++>+++<<[>]+<<",
+            ">>+[<]>",
+            "+++++[<+>-]",
+            ">>>>>>+++++[->+<]",
+            "+++[>" + ("+" * 10) + "[-->+<]<-]>>>+++[-<+<+>>]",
+        ]
+
+        verify_final_tape(self, programs, 8, memoize=True, memo_size=2)
+
+    def test_invalid_arguments(self):
+        self.assertRaises(ValueError, bfi.interpret, "+", memoize=True, tiered=True)
+        self.assertRaises(ValueError, bfi.interpret, "+", memoize=True, max_steps=10)
+        self.assertRaises(ValueError, bfi.interpret, "+", memoize=True, time_limit=1.0)
+
+    def test_cli(self):
+        out = io.StringIO()
+        err = io.StringIO()
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+            ret = main(["--memoize", "--stats", "--buffered",
+                        os.path.join(SAMPLES_DIR, "hello_world.b")])
+
+        self.assertEqual(ret, 0)
+        self.assertEqual(out.getvalue(), "Hello World!\n")
+        self.assertIn("memo hits:", err.getvalue())
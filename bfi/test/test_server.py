@@ -0,0 +1,223 @@
+import io
+import os
+import json
+import socket
+import shutil
+import tempfile
+import threading
+import unittest
+
+from bfi.server import Server, ProgramCache, program_hash
+from bfi.test.utils import SampleCode
+
+class TestProgramCache(unittest.TestCase):
+    def test_get(self):
+        cache = ProgramCache()
+        phash, opcodes, cached = cache.get(None, "+++.")
+        self.assertEqual(phash, program_hash("+++."))
+        self.assertFalse(cached)
+
+        phash2, opcodes2, cached = cache.get(phash)
+        self.assertEqual(phash2, phash)
+        self.assertIs(opcodes2, opcodes)
+        self.assertTrue(cached)
+
+        # Different optimization level is parsed separately
+        phash3, opcodes3, cached = cache.get(phash, opt_level=0)
+        self.assertFalse(cached)
+        self.assertEqual(len(opcodes3), 4)
+
+        self.assertRaises(KeyError, cache.get, "unknown")
+
+    def test_hash_must_match_program(self):
+        cache = ProgramCache()
+        good = program_hash("+++.")
+        self.assertRaises(ValueError, cache.get, good, ",.")
+        self.assertRaises(KeyError, cache.get, good)
+
+        phash, opcodes, cached = cache.get(good, "+++.")
+        self.assertEqual(phash, good)
+
+    def test_eviction(self):
+        cache = ProgramCache(max_size=2)
+        h1 = cache.get(None, "+")[0]
+        h2 = cache.get(None, "-")[0]
+        cache.get(h1)
+        cache.get(None, ".")
+
+        self.assertEqual(len(cache), 2)
+        self.assertTrue(cache.get(h1)[2])
+        self.assertRaises(KeyError, cache.get, h2)
+
+class TestServer(unittest.TestCase):
+    def setUp(self):
+        self.server = Server(workers=2)
+
+    def tearDown(self):
+        self.server.shutdown()
+
+    def run_jobs(self, jobs):
+        infile = io.StringIO("".join([json.dumps(j) + "\n" for j in jobs]))
+        outfile = io.StringIO()
+        self.server.serve_stream(infile, outfile)
+        return [json.loads(line) for line in outfile.getvalue().splitlines()]
+
+    def results(self, responses):
+        # Collect the output & final response for each job
+        ret = {}
+        for resp in responses:
+            output, final = ret.get(resp["id"], ("", None))
+            if "output" in resp:
+                output += resp["output"]
+            else:
+                final = resp
+
+            ret[resp["id"]] = (output, final)
+
+        return ret
+
+    def test_run_jobs(self):
+        with SampleCode("hello_world") as program:
+            responses = self.run_jobs([
+                {"id": 1, "program": program},
+                {"id": 2, "program": ",.,.", "input": "ab", "stats": True},
+                {"id": 3, "hash": program_hash(",.,."), "input": "cd"},
+            ])
+
+        results = self.results(responses)
+
+        output, final = results[1]
+        self.assertEqual(output, "Hello World!\n")
+        self.assertEqual(final["status"], "ok")
+        self.assertNotIn("stats", final)
+
+        output, final = results[2]
+        self.assertEqual(output, "ab")
+        self.assertEqual(final["stats"]["ops"], 4)
+
+        output, final = results[3]
+        self.assertEqual(output, "cd")
+        self.assertEqual(final["status"], "ok")
+
+    def test_errors(self):
+        responses = self.run_jobs([
+            {"id": 1, "program": "+[]", "max_steps": 100},
+            {"id": 2, "hash": "unknown"},
+            {"id": 3, "program": "[[]"},
+            {"id": 4, "program": ">>.", "tape_size": 2},
+            {"id": 5},
+        ])
+
+        results = self.results(responses)
+        self.assertEqual(results[1][1]["status"], "limit")
+        self.assertEqual(results[2][1]["error"], "unknown program hash")
+        self.assertEqual(results[3][1]["status"], "error")
+        self.assertEqual(results[4][1]["status"], "error")
+        self.assertEqual(results[None][1]["status"], "error")
+
+    def test_invalid_job_fields(self):
+        responses = self.run_jobs([
+            {"id": 1, "hash": program_hash("+."), "program": ",."},
+            {"id": 2, "program": ",.", "input": None},
+            {"id": 3, "program": ",.", "input": 5},
+            {"id": 4, "program": "+.", "tape_size": 10 ** 9},
+            {"id": 5, "program": "+.", "tape_size": "big"},
+            {"id": 6, "program": "+.", "max_steps": "lots"},
+        ])
+
+        results = self.results(responses)
+        self.assertEqual(results[1][1]["error"], "hash does not match program")
+
+        # Null input is treated as empty input, not as a request to read the
+        # server's stdin
+        self.assertEqual(results[2][0], "\x00")
+        self.assertEqual(results[2][1]["status"], "ok")
+
+        for job_id in [3, 4, 5, 6]:
+            self.assertEqual(results[job_id][1]["status"], "error")
+
+    def test_server_limits(self):
+        self.server.shutdown()
+        self.server = Server(workers=2, max_steps=1000, time_limit=None,
+                             max_tape_size=100)
+
+        responses = self.run_jobs([
+            {"id": 1, "program": "+[]"},
+            {"id": 2, "program": "+[]", "max_steps": 10 ** 9},
+            {"id": 3, "program": "+++.", "max_steps": 10},
+            {"id": 4, "program": "+.", "tape_size": 100},
+            {"id": 5, "program": "+.", "tape_size": 101},
+        ])
+
+        results = self.results(responses)
+        self.assertEqual(results[1][1]["status"], "limit")
+        self.assertEqual(results[2][1]["status"], "limit")
+        self.assertIn("1000", results[2][1]["error"])
+        self.assertEqual(results[3][1]["status"], "ok")
+        self.assertEqual(results[4][1]["status"], "ok")
+        self.assertEqual(results[5][1]["status"], "error")
+
+        # Limits that could never be reached are rejected, rather than turning
+        # the server's limit off
+        self.server.shutdown()
+        self.server = Server(workers=2, max_steps=1000, time_limit=0.5)
+        results = self.results(self.run_jobs([
+            {"id": 1, "program": "+[]", "max_steps": -1},
+            {"id": 2, "program": "+[]", "max_steps": 100.5},
+            {"id": 3, "program": "+[]", "time_limit": float("nan")},
+            {"id": 4, "program": "+[]", "time_limit": -1.0},
+            {"id": 5, "program": "+[]", "max_steps": 0},
+        ]))
+
+        for job_id in [1, 2, 3, 4]:
+            self.assertEqual(results[job_id][1]["status"], "error")
+            self.assertIn("non-negative", results[job_id][1]["error"])
+
+        self.assertEqual(results[5][1]["status"], "limit")
+
+        # Default time limit stops jobs that would otherwise run forever
+        self.server.shutdown()
+        self.server = Server(workers=1, time_limit=0.1)
+        results = self.results(self.run_jobs([{"id": 1, "program": "+[]"}]))
+        self.assertEqual(results[1][1]["status"], "limit")
+
+    @unittest.skipUnless(hasattr(socket, "AF_UNIX"), "requires Unix sockets")
+    def test_socket_path_not_a_socket(self):
+        tmpdir = tempfile.mkdtemp()
+        path = os.path.join(tmpdir, "important.txt")
+        with open(path, "w") as fh:
+            fh.write("keep me")
+
+        try:
+            self.assertRaises(IOError, self.server.serve_unix, path)
+            with open(path, "r") as fh:
+                self.assertEqual(fh.read(), "keep me")
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    @unittest.skipUnless(hasattr(socket, "AF_UNIX"), "requires Unix sockets")
+    def test_unix_socket(self):
+        tmpdir = tempfile.mkdtemp()
+        path = os.path.join(tmpdir, "bfi.sock")
+
+        t = threading.Thread(target=self.server.serve_unix, args=(path,))
+        t.daemon = True
+        t.start()
+
+        try:
+            for _ in range(100):
+                if os.path.exists(path):
+                    break
+
+                threading.Event().wait(0.01)
+
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(path)
+            sock.sendall(b'{"id": 7, "program": "+++++[>+++++++++++++<-]>."}\n')
+            infile = sock.makefile("r")
+
+            self.assertEqual(json.loads(infile.readline()), {"id": 7, "output": "A"})
+            self.assertEqual(json.loads(infile.readline())["status"], "ok")
+            sock.close()
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
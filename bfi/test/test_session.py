@@ -0,0 +1,112 @@
+import io
+import sys
+import unittest
+import contextlib
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+import bfi
+from bfi import Session, BrainfuckSyntaxError
+from bfi.__main__ import main
+
+class TestSession(unittest.TestCase):
+    def test_tape_kept_between_pieces(self):
+        session = Session()
+        self.assertEqual(session.feed("+"), "")
+        self.assertEqual(session.feed(">++++++++"), "")
+        self.assertEqual(session.tape.pointer, 1)
+        self.assertEqual(session.feed("[<++++++++>-]<."), "A")
+        self.assertEqual(session.tape.pointer, 0)
+        self.assertEqual(session.feed(">>"), "")
+        self.assertEqual(session.tape.pointer, 2)
+
+    def test_unclosed_loop(self):
+        session = Session()
+        session.feed("++++++++")
+        self.assertEqual(session.feed("[>++++"), "")
+        self.assertTrue(session.pending)
+        self.assertEqual(session.tape.cells[0], 8)
+
+        self.assertEqual(session.feed("[>++<-]"), "")
+        self.assertTrue(session.pending)
+
+        self.assertEqual(session.feed(">>+<<<-]>>+."), "A")
+        self.assertFalse(session.pending)
+
+    def test_unmatched_close(self):
+        session = Session()
+        session.feed("+")
+        session.feed("+[>")
+        self.assertRaises(BrainfuckSyntaxError, session.feed, "]]")
+
+        # Pending code was discarded, but not code that was already executed
+        self.assertFalse(session.pending)
+        self.assertEqual(session.feed("."), "\x01")
+
+        self.assertRaises(BrainfuckSyntaxError, session.feed, None)
+
+    def test_runtime_error(self):
+        session = Session(tape_size=5)
+        self.assertRaises(IndexError, session.feed, "+>++>+++>>>>>>+")
+
+        # Pointer is left where execution stopped, matching the cells that
+        # were written before the error
+        self.assertEqual(session.tape.cells, bytearray([1, 2, 3, 0, 0]))
+        self.assertEqual(session.tape.pointer, 8)
+        self.assertEqual(session.feed("<<<<<<+."), "\x04")
+
+        # Same for errors inside loops, and from a scan
+        session = Session(tape_size=5)
+        self.assertRaises(IndexError, session.feed, "+[>+]")
+        self.assertEqual(session.tape.cells, bytearray([1, 1, 1, 1, 1]))
+        self.assertEqual(session.tape.pointer, 5)
+
+        self.assertRaises(IndexError, session.feed, "<<<<<[>]")
+        self.assertEqual(session.tape.pointer, 0)
+
+    def test_input(self):
+        session = Session()
+        self.assertEqual(session.feed(",.", "x"), "x")
+        self.assertEqual(session.feed("+."), "y")
+
+    def test_write_byte(self):
+        out = []
+        session = Session(write_byte=out.append)
+        self.assertEqual(session.feed("+.+."), None)
+        self.assertEqual(out, [1, 2])
+
+    def test_reset(self):
+        session = Session(tape_size=10)
+        session.feed("+++>+[")
+        session.reset()
+        self.assertFalse(session.pending)
+        self.assertEqual(session.tape.pointer, 0)
+        self.assertEqual(session.tape.cells, bytearray(10))
+
+    def test_only_new_code_parsed(self):
+        session = Session()
+        for _ in range(100):
+            session.feed("+>")
+
+        with mock.patch("bfi.parse", wraps=bfi.parse) as parse:
+            session.feed("<.")
+            session.feed("[-")
+            session.feed("]")
+
+        self.assertEqual([c[0][0] for c in parse.call_args_list], ["<.", "[-]"])
+
+class TestRepl(unittest.TestCase):
+    def test_repl(self):
+        stdin = io.StringIO("++++++++\n[>++++++++\n<-]>+.\n]\n,.\nB")
+        out = io.StringIO()
+        with mock.patch.object(sys, "stdin", stdin), contextlib.redirect_stdout(out):
+            ret = main(["--repl"])
+
+        self.assertEqual(ret, 0)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[1], "bfi> bfi> ... A")
+        self.assertEqual(lines[2], "bfi> Error: unmatched ']' symbol")
+        self.assertEqual(lines[3], "bfi> B")
@@ -0,0 +1,57 @@
+import unittest
+
+import bfi
+from bfi.compiler import compile_loop
+from bfi.test.utils import verify_sample_programs, verify_final_tape
+
+class TestTieredExecution(unittest.TestCase):
+    def test_sample_programs(self):
+        for threshold in [1, 2, 10, 100]:
+            verify_sample_programs(self, tiered=True, tier_threshold=threshold)
+
+    def test_stats(self):
+        stats = {}
+        program = "++++++++[>++++++++<-]>+."
+        ret = bfi.interpret(program, buffer_output=True, tiered=True,
+                            tier_threshold=2, stats=stats)
+        self.assertEqual(ret, "A")
+        self.assertEqual(stats["loops_promoted"], 1)
+        self.assertGreater(stats["compile_time"], 0.0)
+
+        stats = {}
+        bfi.interpret(program, buffer_output=True, tiered=True,
+                      tier_threshold=100, stats=stats)
+        self.assertEqual(stats["loops_promoted"], 0)
+        self.assertEqual(stats["compile_time"], 0.0)
+
+    def test_final_tape_state(self):
+        programs = ["+++[>++[>+<-]<-]>>", "+>++>+++<<[>]+<<", ">>+[<]>"]
+        verify_final_tape(self, programs, 16, tiered=True, tier_threshold=1)
+
+    def test_deeply_nested_loops(self):
+        # Outer loop runs 3 times, and is too deeply nested for python to
+        # compile; it should fall back to the interpreter loop. Inner loops
+        # only run once each, so never get compiled.
+        program = "+++[" + (">+[-" * 29) + ("]<" * 29) + "-]+."
+        stats = {}
+        ret = bfi.interpret(program, buffer_output=True, tiered=True,
+                            tier_threshold=1, stats=stats)
+        self.assertEqual(ret, "\x01")
+        self.assertEqual(stats["loops_promoted"], 0)
+        self.assertGreater(stats["compile_time"], 0.0)
+
+    def test_compile_loop(self):
+        opcodes = bfi.parse("+++[>+++<-]>.")
+        loop = compile_loop(opcodes, 1)
+
+        tape = bytearray([3, 0])
+        out = []
+        pi = loop(tape, 0, None, out.append)
+        self.assertEqual(pi, 0)
+        self.assertEqual(tape, bytearray([0, 9]))
+
+        self.assertRaises(ValueError, compile_loop, opcodes, 0)
+
+    def test_invalid_arguments(self):
+        self.assertRaises(ValueError, bfi.interpret, "+", tiered=True, max_steps=10)
+        self.assertRaises(ValueError, bfi.interpret, "+", tiered=True, time_limit=1.0)
@@ -2,6 +2,7 @@ import os
 import time
 import glob
 
+import bfi
 from bfi import interpret
 
 SAMPLES_DIR = os.path.join("bfi", "test", "samples")
@@ -31,6 +32,39 @@ class SampleCode(object):
     def __exit__(self, exc_type, exc_value, traceback):
         self.fp.close()
 
+# Sample programs, and the input to run them with, for checking that an
+# execution mode gives the same output as the default interpreter loop
+SAMPLE_RUNS = [
+    ("hello_world", None),
+    ("bitwidth", None),
+    ("collatz", "66\n\x00"),
+    ("rot13", "brainfuck\n\x04"),
+    ("numwarp", "3.14\n\x00"),
+]
+
+def verify_sample_programs(testcase, **kwargs):
+    # Run each program in SAMPLE_RUNS with and without the execute() keyword
+    # arguments in 'kwargs', and check the output is the same
+    for name, stdin in SAMPLE_RUNS:
+        with SampleCode(name) as program:
+            opcodes = bfi.parse(program)
+
+        expected = bfi.execute(opcodes, stdin, buffer_output=True)
+        out = bfi.execute(opcodes, stdin, buffer_output=True, **kwargs)
+        testcase.assertEqual(out, expected, "%s: output differs" % name)
+
+def verify_final_tape(testcase, programs, tape_size, **kwargs):
+    # Run each program with and without the execute() keyword arguments in
+    # 'kwargs', and check the cells and cell pointer end up the same
+    for program in programs:
+        tape1 = bfi.Tape(tape_size)
+        tape2 = bfi.Tape(tape_size)
+        opcodes = bfi.parse(program)
+        bfi.execute(opcodes, tape=tape1)
+        bfi.execute(opcodes, tape=tape2, **kwargs)
+        testcase.assertEqual(tape1.cells, tape2.cells, program)
+        testcase.assertEqual(tape1.pointer, tape2.pointer, program)
+
 def verify_tape_size(size):
     increment = ""
 